@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from processingpymat.processing import Processing
+from benchmarks.sketches import SKETCHES
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+
+def run_sketch(source, renderer, frames, warmup, seed=0):
+    process = Processing(source, {})
+    renders = process._render_frames(0, warmup + frames, 0, (500, 500), renderer, 100, seed=seed)
+    latencies = []
+    startt = time.perf_counter()
+    for i, _ in enumerate(renders):
+        endt = time.perf_counter()
+        if i >= warmup:
+            latencies.append(endt - startt)
+        startt = endt
+    records = list(process.metrics)[warmup:]
+    latencies = np.array(latencies)
+    return {
+        'fps': len(latencies) / latencies.sum(),
+        'p50': float(np.percentile(latencies, 50)),
+        'p95': float(np.percentile(latencies, 95)),
+        'created_per_frame': float(np.mean([r['created'] for r in records])),
+    }
+
+
+def measure_memory(source, renderer, frames, seed=0):
+    process = Processing(source, {})
+    tracemalloc.start()
+    try:
+        for _ in process._render_frames(0, frames, 0, (500, 500), renderer, 100, seed=seed):
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def check(name, result, baseline, threshold):
+    failures = []
+    if result['fps'] < baseline['fps'] * (1 - threshold):
+        failures.append('fps {:.1f} < baseline {:.1f}'.format(result['fps'], baseline['fps']))
+    if result['p95'] > baseline['p95'] * (1 + threshold):
+        failures.append('p95 {:.4f}s > baseline {:.4f}s'.format(result['p95'], baseline['p95']))
+    if result['peak_memory'] > baseline['peak_memory'] * (1 + threshold):
+        failures.append('peak memory {} > baseline {}'.format(result['peak_memory'], baseline['peak_memory']))
+    # Artist churn is deterministic, so it is compared without the timing threshold
+    if result['created_per_frame'] > baseline['created_per_frame'] + 0.5:
+        failures.append('created/frame {:.1f} > baseline {:.1f}'.format(result['created_per_frame'],
+                                                                       baseline['created_per_frame']))
+    return ['{}: {}'.format(name, f) for f in failures]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark canonical sketches.')
+    parser.add_argument('sketches', nargs='*', default=sorted(SKETCHES.keys()))
+    parser.add_argument('--renderer', action='append',
+                        help='renderers to benchmark (default: patch, collection, raster)')
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=0.3,
+                        help='allowed relative regression of timings and memory')
+    parser.add_argument('--baselines', default=BASELINES)
+    parser.add_argument('--update-baselines', action='store_true')
+    args = parser.parse_args(argv)
+    renderers = args.renderer or ['patch', 'collection', 'raster']
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+
+    failures = []
+    print('{:<28} {:>8} {:>9} {:>9} {:>10} {:>9}'.format(
+        'sketch', 'fps', 'p50 ms', 'p95 ms', 'peak KiB', 'created'))
+    for sketch in args.sketches:
+        for renderer in renderers:
+            name = '{}/{}'.format(sketch, renderer)
+            result = run_sketch(SKETCHES[sketch], renderer, args.frames, args.warmup)
+            result['peak_memory'] = measure_memory(SKETCHES[sketch], renderer, args.warmup + 2)
+            print('{:<28} {:>8.1f} {:>9.2f} {:>9.2f} {:>10.0f} {:>9.1f}'.format(
+                name, result['fps'], result['p50'] * 1000, result['p95'] * 1000,
+                result['peak_memory'] / 1024, result['created_per_frame']))
+            if args.update_baselines:
+                baselines[name] = result
+            elif name in baselines:
+                failures += check(name, result, baselines[name], args.threshold)
+
+    if args.update_baselines:
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        return 0
+    for failure in failures:
+        print('REGRESSION ' + failure)
+    return 1 if len(failures) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
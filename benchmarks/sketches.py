@@ -0,0 +1,114 @@
+# Canonical sketches used to track rendering performance
+
+README_BARS = '''
+def setup():
+    pass
+
+def draw():
+    background(255, 255, 255)
+    for i in range(20):
+        ry = random(2, 10)*10
+        fill(i*10, 100, 20)
+        rect(10 + i*10, 150-ry, 10, ry)
+        fill(255, 0, 0)
+'''
+
+PARTICLES = '''
+N = 2000
+particles = [[random(500), random(500), random(-2, 2), random(-2, 2)] for i in range(N)]
+
+def setup():
+    size(500, 500)
+
+def draw():
+    background(0)
+    noStroke()
+    for p in particles:
+        p[0] = (p[0] + p[2]) % 500
+        p[1] = (p[1] + p[3]) % 500
+        fill(255, p[0] / 2, p[1] / 2, 180)
+        ellipse(p[0], p[1], 6, 6)
+'''
+
+PIXEL_GRID = '''
+CELLS = 50
+cells = [[random(1) > 0.5 for x in range(CELLS)] for y in range(CELLS)]
+
+def setup():
+    size(500, 500)
+
+def draw():
+    background(255)
+    noStroke()
+    fill(0)
+    for y in range(CELLS):
+        row = cells[y]
+        row[int(random(CELLS))] = random(1) > 0.5
+        for x in range(CELLS):
+            if row[x]:
+                rect(x * 10, y * 10, 10, 10)
+'''
+
+LINE_FIELD = '''
+import math
+t = 0
+
+def setup():
+    size(500, 500)
+
+def draw():
+    global t
+    t += 0.05
+    background(255)
+    stroke(0, 0, 80)
+    for y in range(0, 500, 20):
+        for x in range(0, 500, 20):
+            a = math.sin(x * 0.02 + t) + math.cos(y * 0.02 - t)
+            line(x, y, x + 8 * math.cos(a), y + 8 * math.sin(a))
+'''
+
+ROTATING_SHAPES = '''
+angle = 0
+
+def setup():
+    size(500, 500)
+
+def draw():
+    global angle
+    angle += 0.02
+    background(240)
+    for i in range(100):
+        pushMatrix()
+        translate(25 + (i % 10) * 50, 25 + (i // 10) * 50)
+        rotate(angle + i)
+        fill(i * 2, 100, 255 - i * 2)
+        rect(-15, -8, 30, 16)
+        ellipse(0, 0, 10, 20)
+        popMatrix()
+'''
+
+TEXT_HUD = '''
+count = 0
+
+def setup():
+    size(500, 500)
+
+def draw():
+    global count
+    count += 1
+    background(0)
+    fill(255)
+    text('frame', 10, 20)
+    text(str(count), 80, 20)
+    for i in range(30):
+        text('label {}'.format(i), 10 + (i % 3) * 160, 60 + (i // 3) * 40)
+'''
+
+SKETCHES = {
+    'readme_bars': README_BARS,
+    'particles': PARTICLES,
+    'pixel_grid': PIXEL_GRID,
+    'line_field': LINE_FIELD,
+    'rotating_shapes': ROTATING_SHAPES,
+    'text_hud': TEXT_HUD,
+}
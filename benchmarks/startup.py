@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_baselines.json')
+
+KEYS = ['import', 'first_frame', 'first_frame_prewarmed', 'magic_first_frame',
+        'magic_first_frame_prewarmed']
+
+# Every measurement runs in a fresh interpreter, as a cold kernel would.
+# IPython is already loaded in a kernel, so it is imported before timing.
+MEASURE = '''
+import json
+import sys
+import time
+import IPython.core.magic
+startt = time.perf_counter()
+import processingpymat
+imported = time.perf_counter() - startt
+lazy = 'matplotlib.pyplot' not in sys.modules
+if {prewarm}:
+    processingpymat.prewarm()
+from benchmarks.sketches import SKETCHES
+startt = time.perf_counter()
+from processingpymat.processing import Processing
+if {magic}:
+    # The path of the magic: a pyplot figure and the first frame drawn by
+    # the animation
+    import matplotlib.pyplot as plt
+    fig = plt.figure()
+    Processing(SKETCHES['text_hud'], {{}}).plot(fig, fig.gca(), figsize=(500, 500), realtime=False)
+    fig.canvas.draw()
+else:
+    next(Processing(SKETCHES['text_hud'], {{}})._render_frames(0, 1, 0, (500, 500), 'patch', 100))
+first_frame = time.perf_counter() - startt
+print(json.dumps({{'import': imported, 'first_frame': first_frame, 'lazy': lazy}}))
+'''
+
+
+def measure(prewarm=False, magic=False):
+    env = dict(os.environ)
+    env['MPLBACKEND'] = 'Agg'
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    output = subprocess.check_output([sys.executable, '-c', MEASURE.format(prewarm=prewarm, magic=magic)],
+                                     env=env, cwd=ROOT)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def run(repeat):
+    cold = [measure() for _ in range(repeat)]
+    warm = [measure(prewarm=True) for _ in range(repeat)]
+    magic_cold = [measure(magic=True) for _ in range(repeat)]
+    magic_warm = [measure(prewarm=True, magic=True) for _ in range(repeat)]
+    return {
+        'import': float(np.median([r['import'] for r in cold])),
+        'first_frame': float(np.median([r['first_frame'] for r in cold])),
+        'first_frame_prewarmed': float(np.median([r['first_frame'] for r in warm])),
+        'magic_first_frame': float(np.median([r['first_frame'] for r in magic_cold])),
+        'magic_first_frame_prewarmed': float(np.median([r['first_frame'] for r in magic_warm])),
+        'lazy': all([r['lazy'] for r in cold]),
+    }
+
+
+def check(result, baseline, threshold):
+    failures = []
+    if not result['lazy']:
+        failures.append('importing the extension imports matplotlib.pyplot')
+    for key in KEYS:
+        if key in baseline and result[key] > baseline[key] * (1 + threshold):
+            failures.append('{} {:.4f}s > baseline {:.4f}s'.format(key, result[key], baseline[key]))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark import and time to first frame.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='allowed relative regression of timings')
+    parser.add_argument('--baselines', default=BASELINES)
+    parser.add_argument('--update-baselines', action='store_true')
+    args = parser.parse_args(argv)
+
+    result = run(args.repeat)
+    print('{:<28} {:>10}'.format('startup', 'ms'))
+    for key in KEYS:
+        print('{:<28} {:>10.1f}'.format(key, result[key] * 1000))
+
+    if args.update_baselines:
+        with open(args.baselines, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+        return 0
+    failures = []
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            failures = check(result, json.load(f), args.threshold)
+    for failure in failures:
+        print('REGRESSION ' + failure)
+    return 1 if len(failures) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,27 @@
+import threading
 from IPython.core.magic import (Magics, magics_class, cell_magic, line_magic, needs_local_scope)
-import matplotlib.pyplot as plt
-from .processing import Processing
+
+# matplotlib and the drawing machinery are imported on first use, so that
+# loading the extension stays cheap
+
+
+def __getattr__(name):
+    if name == 'Processing':
+        from .processing import Processing
+        return Processing
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def prewarm(background=False):
+    def run():
+        from .processing import prewarm
+        prewarm()
+    if not background:
+        run()
+        return None
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
 
 
 @magics_class
@@ -11,26 +32,40 @@ class ProcessingPyMatplotlibMagics(Magics):
 
     @line_magic
     def lastprocess(self, line):
+        if line.strip() == 'metrics':
+            return self._lastprocess.metrics
         return self._lastprocess
 
+    @line_magic
+    def processing_prewarm(self, line):
+        return prewarm(background=line.strip() != 'wait')
+
     @cell_magic
     @needs_local_scope
     def processing(self, line, cell, local_ns={}):
+        import matplotlib.pyplot as plt
+        from .processing import Processing
+
         args = dict([tuple(arg_) if len(arg_) == 2 else (arg_[0], True)
                      for arg_ in [arg.split('=') for arg in line.split()]])
 
-        self._lastprocess = Processing(cell, local_ns)
+        self._lastprocess = Processing(cell, local_ns, recording='record' in args,
+                                       random_block=int(args.get('random_block', 0)))
 
         fig = plt.figure()
         ax = fig.gca()
 
         kwargs = {}
-        for key in ['skipframes', 'frames', 'framerate']:
+        for key in ['skipframes', 'frames', 'framerate', 'maxskip', 'static_after', 'depth']:
             if key not in args:
                 continue
             kwargs[key] = int(args[key])
+        if 'renderer' in args:
+            kwargs['renderer'] = args['renderer']
         if 'debug' in args:
-            kwargs['drawrate'] = args['debug']
+            kwargs['debug'] = True
+        if 'pipeline' in args:
+            kwargs['pipeline'] = True
 
         anim = self._lastprocess.plot(fig, ax, **kwargs)
         plt.show()
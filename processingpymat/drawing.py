@@ -1,14 +1,36 @@
-import builtins
 import math
+import os
+from collections import deque
 import numpy as np
-import matplotlib.animation as animation
+import matplotlib.collections as collections
+import matplotlib.font_manager as font_manager
+import matplotlib.image as mimage
 import matplotlib.patches as patches
 import matplotlib.lines as mlines
-import matplotlib.transforms as transforms
+from matplotlib.transforms import Affine2D
 import random as rand
+from .metrics import Counters
+from .shapes import (VertexBuffer, VERTEX, BEZIER, QUADRATIC, CURVE, CONTOUR, TOLERANCE,
+                     get_path, contour_path)
 
+CACHE_SIZE = 256
+
+_colors = {}
 
 def to_plt_color(args):
+    # Sketches set the same few colors over and over, so conversions are
+    # memoized
+    try:
+        color = _colors.get(args)
+    except TypeError:
+        return _to_plt_color(args)
+    if color is None:
+        if len(_colors) >= CACHE_SIZE:
+            _colors.clear()
+        color = _colors[args] = _to_plt_color(args)
+    return color
+
+def _to_plt_color(args):
     max_value = 255.0
     color = None
     if len(args) == 1:
@@ -37,6 +59,156 @@ def to_plt_color(args):
         assert False
     return color
 
+def to_rgba(color):
+    if len(color) == 3:
+        return tuple(color) + (1.0,)
+    return tuple(color)
+
+def to_plt_colors(colors, n):
+    # A tuple of 3 or 4 values, or a 1-D array of them which is not one gray
+    # value per item, is a single RGB(A) color for every item
+    single = (np.ndim(colors) == 1 and len(colors) in (3, 4) and
+              (isinstance(colors, tuple) or len(colors) != n))
+    colors = np.asarray(colors, dtype=float) / 255.0
+    if single:
+        colors = np.append(colors, 1.0) if len(colors) == 3 else colors
+    elif colors.ndim == 0 or colors.ndim == 1:
+        colors = np.stack(np.broadcast_arrays(colors, colors, colors, 1.0), axis=-1)
+    elif colors.shape[-1] == 2:
+        colors = np.stack([colors[:, 0], colors[:, 0], colors[:, 0], colors[:, 1]], axis=-1)
+    elif colors.shape[-1] == 3:
+        colors = np.concatenate([colors, np.ones((len(colors), 1))], axis=-1)
+    return np.broadcast_to(colors, (n, 4))
+
+def transform_ellipses(matrix, ws, hs):
+    axes = matrix[np.newaxis, :2, :2] * np.stack([ws, hs], axis=-1)[:, np.newaxis, :]
+    u, s, _ = np.linalg.svd(axes)
+    return s[:, 0], s[:, 1], np.degrees(np.arctan2(u[:, 1, 0], u[:, 0, 0]))
+
+def transform_ellipse(matrix, x, y, w, h):
+    cx, cy = matrix[:2, :2] @ (x, y) + matrix[:2, 2]
+    u, s, _ = np.linalg.svd(matrix[:2, :2] @ np.diag((w, h)))
+    angle = math.degrees(math.atan2(u[1, 0], u[0, 0]))
+    return cx, cy, s[0], s[1], angle
+
+class MatrixStack:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.matrix = np.identity(3)
+        self.affine = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0)
+        self.identity = True
+        self.aligned = True
+        self._stack = []
+
+    def push(self):
+        self._stack.append((self.matrix, self.affine, self.identity, self.aligned))
+
+    def pop(self):
+        self.matrix, self.affine, self.identity, self.aligned = self._stack.pop()
+
+    def apply(self, matrix):
+        self.matrix = self.matrix @ matrix
+        a, b, c = self.matrix[0]
+        d, e, f = self.matrix[1]
+        self.affine = (float(a), float(b), float(c), float(d), float(e), float(f))
+        self.aligned = b == 0 and d == 0
+        self.identity = self.affine == (1.0, 0.0, 0.0, 0.0, 1.0, 0.0)
+
+    def translate(self, dx, dy):
+        self.apply(np.array([[1, 0, dx], [0, 1, dy], [0, 0, 1]], dtype=float))
+
+    def rotate(self, theta):
+        c, s = math.cos(theta), math.sin(theta)
+        self.apply(np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]]))
+
+    def scale(self, sx, sy):
+        self.apply(np.array([[sx, 0, 0], [0, sy, 0], [0, 0, 1]], dtype=float))
+
+    def transform_point(self, x, y):
+        a, b, c, d, e, f = self.affine
+        return a * x + b * y + c, d * x + e * y + f
+
+    def transform(self, xy):
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        if self.identity:
+            return xy
+        return xy @ self.matrix[:2, :2].T + self.matrix[:2, 2]
+
+    def rotation(self):
+        a, b, c, d, e, f = self.affine
+        return math.atan2(d, a)
+
+def arrays_equal(a, b):
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        if x is y:
+            continue
+        if isinstance(x, np.ndarray) or isinstance(y, np.ndarray):
+            if not np.array_equal(x, y):
+                return False
+        elif isinstance(x, (list, tuple)) and isinstance(y, (list, tuple)):
+            if not arrays_equal(x, y):
+                return False
+        elif x != y:
+            return False
+    return True
+
+def rect_grid(rects):
+    # Compresses the rect edges into a grid and counts how many rects
+    # cover each cell
+    x0 = np.minimum(rects[:, 0], rects[:, 0] + rects[:, 2])
+    x1 = np.maximum(rects[:, 0], rects[:, 0] + rects[:, 2])
+    y0 = np.minimum(rects[:, 1], rects[:, 1] + rects[:, 3])
+    y1 = np.maximum(rects[:, 1], rects[:, 1] + rects[:, 3])
+    xs = np.unique(np.concatenate([x0, x1]))
+    ys = np.unique(np.concatenate([y0, y1]))
+    ix0, ix1 = np.searchsorted(xs, x0), np.searchsorted(xs, x1)
+    iy0, iy1 = np.searchsorted(ys, y0), np.searchsorted(ys, y1)
+    counts = np.zeros((len(ys), len(xs)), dtype=int)
+    np.add.at(counts, (iy0, ix0), 1)
+    np.add.at(counts, (iy0, ix1), -1)
+    np.add.at(counts, (iy1, ix0), -1)
+    np.add.at(counts, (iy1, ix1), 1)
+    return xs, ys, counts.cumsum(axis=0).cumsum(axis=1)[:-1, :-1]
+
+def cover_mask(mask):
+    # Runs of covered cells in each column, merged with identical runs in
+    # the following columns. Returns (ix0, iy0, ix1, iy1) cell ranges.
+    rects = []
+    open_runs = {}
+    for col in range(mask.shape[1] + 1):
+        runs = []
+        if col < mask.shape[1]:
+            d = np.diff(np.concatenate(([0], mask[:, col].astype(np.int8), [0])))
+            runs = list(zip(np.flatnonzero(d == 1).tolist(), np.flatnonzero(d == -1).tolist()))
+        for run in [run for run in open_runs if run not in runs]:
+            rects.append((open_runs.pop(run), run[0], col, run[1]))
+        for run in runs:
+            if run not in open_runs:
+                open_runs[run] = col
+    return sorted(rects)
+
+def lattice_mask(rects, max_cells=1 << 20):
+    # Rects of one size placed on a common grid, like the cells of a pixel
+    # grid, as a boolean mask of the grid and its extent
+    w, h = rects[0, 2], rects[0, 3]
+    if w <= 0 or h <= 0 or not (np.all(rects[:, 2] == w) and np.all(rects[:, 3] == h)):
+        return None
+    x0, y0 = rects[:, 0].min(), rects[:, 1].min()
+    cols = np.rint((rects[:, 0] - x0) / w)
+    rows = np.rint((rects[:, 1] - y0) / h)
+    if not (np.allclose(x0 + cols * w, rects[:, 0]) and np.allclose(y0 + rows * h, rects[:, 1])):
+        return None
+    shape = (int(rows.max()) + 1, int(cols.max()) + 1)
+    if shape[0] * shape[1] > max_cells:
+        return None
+    mask = np.zeros(shape, dtype=bool)
+    mask[rows.astype(int), cols.astype(int)] = True
+    return mask, (float(x0), float(x0 + shape[1] * w), float(y0 + shape[0] * h), float(y0))
+
 # from https://github.com/Abdur-rahmaanJ/ppython
 def random(*args):
     if len(args) == 0:
@@ -67,31 +239,156 @@ def radians(degrees):
     return degrees / 180.0 * math.pi
 
 class PFont:
-    def __init__(self, name):
+    def __init__(self, name, size=None):
         self.name = name
+        self.size = size
+
+def to_font(which):
+    # textFont() accepts the name of a font as well as createFont() results
+    return which if isinstance(which, PFont) else PFont(which)
+
+_font_properties = {}
+
+def get_font_properties(name, size):
+    # Resolved once per font and size instead of on every text() call
+    key = (name, size)
+    if key not in _font_properties:
+        _font_properties[key] = font_manager.FontProperties(family=name, size=size)
+    return _font_properties[key]
+
+class PImage:
+    def __init__(self, pixels, path=None):
+        self.pixels = pixels
+        self.height, self.width = pixels.shape[:2]
+        self.path = path
+
+IMAGE_CACHE_SIZE = 32
+_images = {}
+
+def load_image(path):
+    # Decoded once per path until the file changes. The pixels are shared by
+    # every user of the image, so they are read-only.
+    mtime = os.path.getmtime(path)
+    cached = _images.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    pixels = mimage.imread(path)
+    if pixels.dtype != np.uint8:
+        pixels = np.rint(pixels * 255).astype(np.uint8)
+    if pixels.ndim == 2:
+        pixels = np.stack([pixels] * 3, axis=-1)
+    if pixels.shape[2] == 3:
+        pixels = np.concatenate([pixels, np.full(pixels.shape[:2] + (1,), 255, dtype=np.uint8)],
+                                axis=2)
+    pixels.flags.writeable = False
+    if len(_images) >= IMAGE_CACHE_SIZE:
+        _images.clear()
+    image = PImage(pixels, path)
+    _images[path] = (mtime, image)
+    return image
+
+def share_image_data(image, rgba):
+    # set_data copies the array, while pixels are shared with the image so
+    # that an update only invalidates what it cached from them. This relies
+    # on private attributes of AxesImage, and falls back to set_data.
+    if not (hasattr(image, '_A') and hasattr(image, '_imcache')):
+        image.set_data(rgba)
+        return
+    image._A = rgba
+    image._imcache = None
+    image.stale = True
+
+def style_row(kwargs):
+    if kwargs.get('fill', True):
+        facecolor = to_rgba(kwargs.get('facecolor', (0.0, 0.0, 0.0)))
+    else:
+        facecolor = (0.0, 0.0, 0.0, 0.0)
+    edgecolor = kwargs.get('edgecolor', kwargs.get('color'))
+    linewidth = kwargs.get('linewidth')
+    if edgecolor is None or linewidth is None:
+        edgecolor = (0.0, 0.0, 0.0, 0.0)
+        linewidth = 0
+    else:
+        edgecolor = to_rgba(edgecolor)
+    return facecolor, edgecolor, linewidth, kwargs.get('antialiased', True)
+
+class Style(dict):
+    # Interned, read-only artist properties. Styles are only created by
+    # get_style, so equal styles are the same object and compare by identity.
+    __hash__ = object.__hash__
+
+    def __init__(self, kwargs):
+        super().__init__(kwargs)
+        self.row = style_row(kwargs)
+
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('Style is immutable')
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+_styles = {}
+
+def get_style(**kwargs):
+    key = tuple(sorted(kwargs.items()))
+    style = _styles.get(key)
+    if style is None:
+        if len(_styles) >= CACHE_SIZE:
+            _styles.clear()
+        style = _styles[key] = Style(kwargs)
+    return style
+
+# Artists are ordered by zorder; keeping them within [1, 2) preserves the
+# draw order of reused artists and leaves the axes decorations on top.
+ZORDER_BASE = 1
+ZORDER_STEP = 1e-9
+# Coalesced rects on a uniform grid become an image above this many rects
+IMAGE_MIN_RECTS = 16
 
 class PatchCache:
-    def __init__(self, ax):
+    def __init__(self, ax, coalesce=True):
         self.ax = ax
+        self.coalesce = coalesce
         self.patches = []
         self.updates = []
         self.cache = None
         self._background = None
         self._buffer = None
+        self._state = {}
+        self.counters = Counters()
 
     def begin(self):
         self.updates = []
+        self.counters.reset()
 
     def flush(self):
         self.flush_buffer()
         if self.cache is None:
             return
-        remainps = [cp for _, cp in self.cache]
-        [rp.remove() for rp in reversed(remainps)]
+        removed = 0
+        for pool in self.cache.values():
+            [rp.remove() for rp in reversed(pool)]
+            removed += len(pool)
+        if removed > 0:
+            self.counters.removed += removed
+            self.counters.teardowns += 1
         self.cache = None
+        if len(self._state) > len(self.patches):
+            self._state = dict([(p, self._state[p]) for _, p in self.patches])
 
     def clear(self):
-        self.cache = self.patches
+        if self.cache is None:
+            self.cache = {}
+        for typename, p in self.patches:
+            if typename not in self.cache:
+                self.cache[typename] = deque()
+            self.cache[typename].append(p)
         self.patches = []
         self.updates = []
         self._buffer = None
@@ -101,36 +398,48 @@ class PatchCache:
         self._buffer = None
 
     def add_rect(self, x, y, w, h, kwargs):
-        if not self._should_push_buffer(x, y, w, h, kwargs):
+        # Unstroked rects of the same style with nothing drawn in between are
+        # collected and replaced by a cover of their union when flushed
+        stroked = 'linewidth' in kwargs and kwargs['linewidth'] is not None and kwargs['linewidth'] > 0
+        if stroked or not self.coalesce:
             self.flush_buffer()
-        if self._buffer is None:
-            self._buffer = (x, y, w, h, kwargs)
+            self._add_rect(x, y, w, h, kwargs)
             return
-        x0, y0, w0, h0, kwargs0 = self._buffer
-        if x0 == x and w0 == w:
-            self._buffer = (x, min(y, y0), w, max(y + h, y0 + h0) - min(y, y0), kwargs)
-        if y0 == y and h0 == h:
-            self._buffer = (min(x, x0), y, max(x + w, x0 + w0) - min(x, x0), h, kwargs)
-
-    def _should_push_buffer(self, x, y, w, h, kwargs):
+        if self._buffer is not None and self._buffer[0] != kwargs:
+            self.flush_buffer()
         if self._buffer is None:
-            return True
-        x0, y0, w0, h0, kwargs0 = self._buffer
-        if kwargs0 != kwargs:
-            return False
-        if 'linewidth' in kwargs and kwargs['linewidth'] is not None and kwargs['linewidth'] > 0:
-            return False
-        if x0 == x and w0 == w and (y + h == y0 or y0 + h0 == y):
-            return True
-        if y0 == y and h0 == h and (x + w == x0 or x0 + w0 == x):
-            return True
-        return False
+            self._buffer = (kwargs, [])
+        self._buffer[1].append((x, y, w, h))
+
+    def _add_rects(self, rects, kwargs):
+        if len(rects) == 1:
+            self._add_rect(*rects[0], kwargs)
+            return
+        rects = np.array(rects, dtype=float)
+        xs, ys, counts = rect_grid(rects)
+        filled = kwargs.get('fill', True) and 'facecolor' in kwargs
+        if counts.max() > 1 and (not filled or to_rgba(kwargs['facecolor'])[3] < 1):
+            # Overlapping translucent rects blend differently when merged
+            for x, y, w, h in rects.tolist():
+                self._add_rect(x, y, w, h, kwargs)
+            return
+        cover = cover_mask(counts > 0)
+        lattice = lattice_mask(rects) if filled and len(cover) > IMAGE_MIN_RECTS else None
+        if lattice is not None:
+            # Uniform cells are drawn as one image
+            self.counters.merges += len(rects) - 1
+            self._add_image(lattice[0], lattice[1], kwargs)
+            return
+        self.counters.merges += len(rects) - len(cover)
+        for ix0, iy0, ix1, iy1 in cover:
+            self._add_rect(float(xs[ix0]), float(ys[iy0]), float(xs[ix1] - xs[ix0]),
+                           float(ys[iy1] - ys[iy0]), kwargs)
 
     def _add_buffer_as_patch(self, buffer):
         if buffer is None:
             return
-        x, y, w, h, kwargs = buffer
-        self._add_rect(x, y, w, h, kwargs)
+        kwargs, rects = buffer
+        self._add_rects(rects, kwargs)
 
     def _is_rect(self, points):
         if len(points) != 4:
@@ -142,82 +451,398 @@ class PatchCache:
         return True
 
     def _add_rect(self, x, y, w, h, kwargs):
-        cached = self._get_cache('rect')
-        if cached is not None:
+        def update(p):
+            p.set_xy((x, y))
+            p.set_width(w)
+            p.set_height(h)
+        self._add_artist('rect', (x, y, w, h), kwargs,
+                         lambda: self.ax.add_patch(patches.Rectangle((x, y), w, h, **kwargs)),
+                         update)
+
+    def add_ellipse(self, x, y, w, h, kwargs, angle=0.0):
+        self.flush_buffer()
+        def update(p):
+            p.set_center((x, y))
+            p.set_width(w)
+            p.set_height(h)
+            p.set_angle(angle)
+        self._add_artist('ellipse', (x, y, w, h, angle), kwargs,
+                         lambda: self.ax.add_patch(patches.Ellipse((x, y), w, h, angle=angle,
+                                                                   **kwargs)),
+                         update)
+
+    def _add_image(self, mask, extent, kwargs):
+        color = to_rgba(kwargs['facecolor'])
+        def create():
+            image = mimage.AxesImage(self.ax, interpolation='nearest', extent=extent)
+            image.set_data(self._mask_to_rgba(mask, color))
+            return self.ax.add_image(image)
+        def update(p):
+            p.set_data(self._mask_to_rgba(mask, color))
+            p.set_extent(extent)
+        self._add_artist('image', (mask, extent, color), None, create, update)
+
+    def add_image(self, rgba, extent, version=0, affine=None):
+        # The version tells changes of pixels updated in place. With an
+        # affine transform, the extent is in the coordinates it maps from.
+        self.flush_buffer()
+        self._add_rgba_image(rgba, extent, version, affine)
+
+    def _add_rgba_image(self, rgba, extent, version, affine=None):
+        def transform():
+            if affine is None:
+                return self.ax.transData
+            a, b, c, d, e, f = affine
+            return Affine2D(np.array([[a, b, c], [d, e, f], [0, 0, 1]])) + self.ax.transData
+        def create():
+            image = mimage.AxesImage(self.ax, interpolation='nearest', extent=extent)
+            share_image_data(image, rgba)
+            image.set_transform(transform())
+            return self.ax.add_image(image)
+        def update(p):
+            share_image_data(p, rgba)
+            p.set_extent(extent)
+            p.set_transform(transform())
+        self._add_artist('image', (rgba, version, extent, affine), None, create, update)
+
+    def _mask_to_rgba(self, mask, color):
+        rgba = np.zeros(mask.shape + (4,), dtype=np.uint8)
+        rgba[mask] = np.rint(np.multiply(color, 255))
+        return rgba
+
+    def add_polygon(self, xy, closed, kwargs):
+        self.flush_buffer()
+        self._add_polygon(xy, closed, kwargs)
+
+    def add_path(self, contours, closed, kwargs):
+        self.flush_buffer()
+        self._add_compound(contours, closed, kwargs)
+
+    def _add_compound(self, contours, closed, kwargs):
+        # Shapes with contours, which need a path of several polygons
+        def update(p):
+            p.set_path(contour_path(contours, closed))
+        self._add_artist('compound', (contours, closed), kwargs,
+                         lambda: self.ax.add_patch(patches.PathPatch(contour_path(contours, closed),
+                                                                     **kwargs)),
+                         update)
+
+    def _add_polygon(self, xy, closed, kwargs):
+        def update(p):
+            p.set_xy(xy)
+            p.set_closed(closed)
+        self._add_artist('polygon', (xy, closed), kwargs,
+                         lambda: self.ax.add_patch(patches.Polygon(xy, closed=closed, **kwargs)),
+                         update)
+
+    def add_line(self, x1, y1, x2, y2, kwargs):
+        self.flush_buffer()
+        xdata = [x1, x2]
+        ydata = [y1, y2]
+        self._add_artist('line', (x1, y1, x2, y2), kwargs,
+                         lambda: self.ax.add_line(mlines.Line2D(xdata, ydata, **kwargs)),
+                         lambda p: p.set_data(xdata, ydata))
+
+    def add_text(self, x, y, s, kwargs):
+        self.flush_buffer()
+        def update(p):
+            p.set_text(s)
+            p.set_position((x, y))
+        self._add_artist('text', (x, y, s), kwargs,
+                         lambda: self.ax.text(x, y, s, **kwargs),
+                         update)
+
+    def _add_artist(self, typename, geometry, kwargs, create, update):
+        # The arguments an artist was last set up with are kept, so that
+        # only artists whose geometry or style really changed are updated
+        # and reported for redrawing
+        p = self._get_cache(typename)
+        if p is None:
+            p = create()
+            self.counters.created += 1
+            changed = True
+        else:
+            old_geometry, old_kwargs = self._state[p]
             changed = False
-            oldx, oldy = cached.get_xy()
-            if oldx != x or oldy != y:
-                cached.set_xy((x, y))
-                changed = True
-            if cached.get_width() != w:
-                cached.set_width(w)
-                changed = True
-            if cached.get_height() != h:
-                cached.set_height(h)
+            if not arrays_equal(old_geometry, geometry):
+                update(p)
                 changed = True
-            if self._set_kwargs(cached, kwargs):
+            if old_kwargs != kwargs:
+                self._set_kwargs(p, kwargs, old_kwargs)
                 changed = True
-            p = cached
-            if changed:
-                self.updates.append(p)
-        else:
-            rect = patches.Rectangle((x, y), w, h, **kwargs)
-            p = self.ax.add_patch(rect)
+        self._state[p] = (geometry, kwargs)
+        if self._push(typename, p) or changed:
             self.updates.append(p)
-        self.patches.append(('rect', p))
 
-    def add_ellipse(self, x, y, w, h, kwargs):
+    def add_ellipses(self, offsets, widths, heights, angles, style):
         self.flush_buffer()
-        cached = self._get_cache('ellipse{},{}'.format(w, h))
-        if cached is not None:
-            cached.set_center((x, y))
-            self._set_kwargs(cached, kwargs)
-            p = cached
-        else:
-            p = patches.Ellipse((x, y), w, h, **kwargs)
-            p = self.ax.add_patch(p)
-        self.patches.append(('ellipse{},{}'.format(w, h), p))
-        self.updates.append(p)
+        self._add_collection('ellipse', (offsets, widths, heights, angles) + tuple(style))
 
-    def add_polygon(self, xy, closed, kwargs):
+    def add_polygons(self, verts, closed, style):
         self.flush_buffer()
-        self._add_polygon(xy, closed, kwargs)
+        self._add_collection('polygon' if closed else 'path', (verts,) + tuple(style))
 
-    def _add_polygon(self, xy, closed, kwargs):
-        cached = self._get_cache('polygon')
-        if cached is not None:
-            cached.set_xy(xy)
-            cached.set_closed(closed)
-            self._set_kwargs(cached, kwargs)
-            p = cached
+    def add_lines(self, segments, style):
+        self.flush_buffer()
+        self._add_collection('line', (segments,) + tuple(style))
+
+    def _add_collection(self, kind, arrays):
+        self._add_artist(kind + 's', arrays, None,
+                         lambda: self.ax.add_collection(self._create_collection(kind, arrays),
+                                                        autolim=False),
+                         lambda c: self._set_arrays(c, kind, arrays))
+
+    def _create_collection(self, kind, arrays):
+        if kind == 'ellipse':
+            offsets, widths, heights, angles, fc, ec, lw, aa = arrays
+            return collections.EllipseCollection(widths, heights, angles,
+                                                 units='xy',
+                                                 offsets=offsets,
+                                                 offset_transform=self.ax.transData,
+                                                 facecolors=fc, edgecolors=ec,
+                                                 linewidths=lw, antialiaseds=aa)
+        verts, fc, ec, lw, aa = arrays
+        if kind == 'line':
+            return collections.LineCollection(verts, colors=ec, capstyle='round',
+                                              linewidths=lw, antialiaseds=aa)
+        return collections.PolyCollection(verts, closed=kind == 'polygon',
+                                          facecolors=fc, edgecolors=ec,
+                                          linewidths=lw, antialiaseds=aa)
+
+    def _set_arrays(self, c, kind, arrays):
+        if kind == 'ellipse':
+            offsets, widths, heights, angles, fc, ec, lw, aa = arrays
+            c.set_offsets(offsets)
+            c.set_widths(widths)
+            c.set_heights(heights)
+            c.set_angles(angles)
+        elif kind == 'line':
+            verts, fc, ec, lw, aa = arrays
+            c.set_segments(verts)
         else:
-            p = patches.Polygon(xy,
-                                closed=closed,
-                                **kwargs)
-            p = self.ax.add_patch(p)
-        self.patches.append(('polygon', p))
-        self.updates.append(p)
+            verts, fc, ec, lw, aa = arrays
+            c.set_verts(verts, closed=kind == 'polygon')
+        if kind != 'line':
+            c.set_facecolors(fc)
+        c.set_edgecolors(ec)
+        c.set_linewidths(lw)
+        c.set_antialiaseds(aa)
 
     def _get_cache(self, typename):
-        if self.cache is None or len(self.cache) == 0:
+        if self.cache is None:
             return None
-        cachetype, p = self.cache.pop(0)
-        if cachetype == typename:
-            return p
-        # Remove all cached objects when any requested objects not found
-        remainps = [cp for _, cp in self.cache] + [p]
-        [rp.remove() for rp in reversed(remainps)]
-        self.cache = None
-        return None
+        pool = self.cache.get(typename)
+        if pool is None or len(pool) == 0:
+            return None
+        self.counters.reused += 1
+        return pool.popleft()
+
+    def _push(self, typename, p):
+        # Reused artists keep their old position in the axes, so the draw
+        # order is carried by zorder instead
+        zorder = ZORDER_BASE + len(self.patches) * ZORDER_STEP
+        self.patches.append((typename, p))
+        if p.get_zorder() == zorder:
+            return False
+        p.set_zorder(zorder)
+        return True
 
-    def _set_kwargs(self, patch, kwargs):
-        changed = False
+    def _set_kwargs(self, patch, kwargs, old_kwargs):
         for k, v in kwargs.items():
-            if getattr(patch, 'get_{}'.format(k))() == v:
+            if k in old_kwargs and old_kwargs[k] == v:
                 continue
             getattr(patch, 'set_{}'.format(k))(v)
-            changed = True
-        return changed
+
+class CollectionRun:
+    def __init__(self, kind):
+        self.kind = kind
+        self.chunks = []
+        self.texts = []
+        self.images = []
+        self.paths = []
+        self.bbox = None
+        self._clear_items()
+
+    def extend(self, bbox):
+        if self.bbox is None:
+            self.bbox = bbox
+            return
+        x0, y0, x1, y1 = self.bbox
+        bx0, by0, bx1, by1 = bbox
+        if bx0 < x0 or by0 < y0 or bx1 > x1 or by1 > y1:
+            self.bbox = (min(x0, bx0), min(y0, by0), max(x1, bx1), max(y1, by1))
+
+    def _clear_items(self):
+        self.verts = []
+        self.offsets = []
+        self.widths = []
+        self.heights = []
+        self.angles = []
+        self.facecolors = []
+        self.edgecolors = []
+        self.linewidths = []
+        self.antialiaseds = []
+
+    def add_style(self, kwargs):
+        facecolor, edgecolor, linewidth, antialiased = (kwargs.row if isinstance(kwargs, Style)
+                                                        else style_row(kwargs))
+        self.facecolors.append(facecolor)
+        self.edgecolors.append(edgecolor)
+        self.linewidths.append(linewidth)
+        self.antialiaseds.append(antialiased)
+
+    def add_chunk(self, geometry, style):
+        self._seal()
+        self.chunks.append(tuple(geometry) + tuple(style))
+
+    def _seal(self):
+        # Shapes added one by one become a chunk of arrays, so that they
+        # keep their order relative to chunks added in bulk
+        if len(self.facecolors) == 0:
+            return
+        if self.kind == 'ellipse':
+            geometry = (np.asarray(self.offsets, dtype=float).reshape(-1, 2),
+                        np.asarray(self.widths, dtype=float),
+                        np.asarray(self.heights, dtype=float),
+                        np.asarray(self.angles, dtype=float))
+        else:
+            geometry = (self.verts,)
+        self.chunks.append(geometry + (np.asarray(self.facecolors, dtype=float).reshape(-1, 4),
+                                       np.asarray(self.edgecolors, dtype=float).reshape(-1, 4),
+                                       np.asarray(self.linewidths, dtype=float),
+                                       np.asarray(self.antialiaseds, dtype=bool)))
+        self._clear_items()
+
+    def arrays(self):
+        self._seal()
+        if len(self.chunks) == 1:
+            return self.chunks[0]
+        fields = list(zip(*self.chunks))
+        if self.kind == 'ellipse':
+            return tuple([np.concatenate(f) for f in fields])
+        verts = [xy for chunk in fields[0] for xy in chunk]
+        return (verts,) + tuple([np.concatenate(f) for f in fields[1:]])
+
+# Runs looked back at for one of the same kind to add a shape to
+MERGE_LOOKBACK = 8
+UNBOUNDED = (-math.inf, -math.inf, math.inf, math.inf)
+
+def _overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+def _shape_bbox(x0, y0, x1, y1, kwargs):
+    # Bounds of a shape with room for its stroke and antialiasing
+    linewidth = (kwargs.row if isinstance(kwargs, Style) else style_row(kwargs))[2]
+    pad = 2 * linewidth + 1
+    return (x0 - pad, y0 - pad, x1 + pad, y1 + pad)
+
+
+class CollectionCache(PatchCache):
+    def __init__(self, ax, coalesce=True):
+        super().__init__(ax, coalesce=coalesce)
+        self._runs = []
+
+    def flush(self):
+        self.flush_buffer()
+        for run in self._runs:
+            self._add_run(run)
+        self._runs = []
+        super().flush()
+
+    def clear(self):
+        super().clear()
+        self._runs = []
+
+    def _add_rect(self, x, y, w, h, kwargs):
+        xy = [(x, y), (x + w, y), (x + w, y + h), (x, y + h)]
+        self._add_polygon(xy, True, kwargs)
+
+    def add_ellipse(self, x, y, w, h, kwargs, angle=0.0):
+        self.flush_buffer()
+        r = max(abs(w), abs(h)) / 2
+        run = self._get_run('ellipse', _shape_bbox(x - r, y - r, x + r, y + r, kwargs))
+        run.offsets.append((x, y))
+        run.widths.append(w)
+        run.heights.append(h)
+        run.angles.append(angle)
+        run.add_style(kwargs)
+
+    def add_line(self, x1, y1, x2, y2, kwargs):
+        self.flush_buffer()
+        xy = np.array([[x1, y1], [x2, y2]], dtype=float)
+        run = self._get_run('line', _shape_bbox(min(x1, x2), min(y1, y2), max(x1, x2),
+                                                max(y1, y2), kwargs))
+        run.verts.append(xy)
+        run.add_style(kwargs)
+
+    def add_text(self, x, y, s, kwargs):
+        self.flush_buffer()
+        self._get_run('text').texts.append((x, y, s, kwargs))
+
+    def _add_image(self, mask, extent, kwargs):
+        self._get_run('image').images.append((PatchCache._add_image, (mask, extent, kwargs)))
+
+    def add_image(self, rgba, extent, version=0, affine=None):
+        self.flush_buffer()
+        self._get_run('image').images.append((PatchCache._add_rgba_image,
+                                              (rgba, extent, version, affine)))
+
+    def add_path(self, contours, closed, kwargs):
+        self.flush_buffer()
+        self._get_run('compound').paths.append((contours, closed, kwargs))
+
+    def _add_polygon(self, xy, closed, kwargs):
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        (x0, y0), (x1, y1) = xy.min(axis=0).tolist(), xy.max(axis=0).tolist()
+        run = self._get_run('polygon' if closed else 'path', _shape_bbox(x0, y0, x1, y1, kwargs))
+        run.verts.append(xy)
+        run.add_style(kwargs)
+
+    def add_ellipses(self, offsets, widths, heights, angles, style):
+        self.flush_buffer()
+        self._get_run('ellipse').add_chunk((offsets, widths, heights, angles), style)
+
+    def add_polygons(self, verts, closed, style):
+        self.flush_buffer()
+        self._get_run('polygon' if closed else 'path').add_chunk((verts,), style)
+
+    def add_lines(self, segments, style):
+        self.flush_buffer()
+        self._get_run('line').add_chunk((segments,), style)
+
+    def _get_run(self, kind, bbox=UNBOUNDED):
+        # A shape joins the last run of its kind if it does not overlap any
+        # shape drawn after that run, so that interleaved kinds of shapes
+        # still end up in a few collections
+        runs = self._runs
+        if len(runs) > 0 and runs[-1].kind == kind:
+            runs[-1].extend(bbox)
+            return runs[-1]
+        for run in runs[:-MERGE_LOOKBACK - 1:-1]:
+            if run.kind == kind:
+                run.extend(bbox)
+                return run
+            if _overlaps(run.bbox, bbox):
+                break
+        run = CollectionRun(kind)
+        run.extend(bbox)
+        self._runs.append(run)
+        return run
+
+    def _add_run(self, run):
+        if run.kind == 'text':
+            for x, y, s, kwargs in run.texts:
+                super().add_text(x, y, s, kwargs)
+            return
+        if run.kind == 'image':
+            for add, args in run.images:
+                add(self, *args)
+            return
+        if run.kind == 'compound':
+            for contours, closed, kwargs in run.paths:
+                super()._add_compound(contours, closed, kwargs)
+            return
+        self._add_collection(run.kind, run.arrays())
 
 class DrawingContextBase:
     def __init__(self):
@@ -230,34 +855,66 @@ class DrawingContextBase:
         self.TOP = 4
         self.BOTTOM = 5
         self.BASELINE = 6
+        # Globals of the sketch, which sees width and height as variables
+        self.namespace = {}
 
 class DrawingContext(DrawingContextBase):
-    def __init__(self, fig, ax, figsize):
+    def __init__(self, fig, ax, figsize, batched=False, coalesce=True):
         super().__init__()
         self.fig = fig
         self.ax = ax
         self.width, self.height = figsize
-        self.patches = PatchCache(ax)
-        self.texts = []
+        self.patches = (CollectionCache(ax, coalesce=coalesce) if batched
+                        else PatchCache(ax, coalesce=coalesce))
         self._antialiased = True
         self._fill = (1.0, 1.0, 1.0)
         self._stroke = (0.0, 0.0, 0.0)
         self._strokeSize = 1
-        self._points = []
-        self._transforms = []
-        self._currentTransform = None
+        # Patch and line styles for the current state
+        self._styles = [None, None]
+        self._vertices = VertexBuffer()
+        self._tolerance = TOLERANCE
+        self.matrix = MatrixStack()
         self._textAlignX = 'left'
         self._textAlignY = 'baseline'
+        self._textFont = None
+        self._textSize = None
+        self._textLeading = None
+        self.pixels = None
+        self._pixels_version = 0
 
     def clear(self):
-        self._transforms = []
-        self._currentTransform = None
+        self.matrix.reset()
         self.patches.begin()
 
     def flush(self):
         self.patches.flush()
 
+    @property
+    def updates(self):
+        return self.patches.updates
+
+    @property
+    def artists(self):
+        return [p for _, p in self.patches.patches]
+
+    @property
+    def changed(self):
+        # Removed artists leave no updates behind but still change the frame
+        return len(self.patches.updates) > 0 or self.patches.counters.removed > 0
+
+    @property
+    def counters(self):
+        return self.patches.counters
+
     def _to_patch_args(self, line=False):
+        # The style only changes with the drawing state, not per shape
+        style = self._styles[line]
+        if style is None:
+            style = self._styles[line] = get_style(**self._create_patch_args(line))
+        return style
+
+    def _create_patch_args(self, line):
         args = {'antialiased': self._antialiased}
         if not line:
             if self._fill is not None:
@@ -270,64 +927,177 @@ class DrawingContext(DrawingContextBase):
             args['edgecolor' if not line else 'color'] = self._stroke
         else:
             args['linewidth'] = 0
-        if self._currentTransform is not None:
-            trans, rotate = self._currentTransform
-            args['transform'] = rotate + trans + self.ax.transData
-        else:
-            args['transform'] = self.ax.transData
+        if line:
+            # Lines end in round caps like in Processing, whatever the renderer
+            args['solid_capstyle'] = 'round'
         return args
 
     def background(self, *args):
-        for t in self.texts:
-            t.remove()
-        self.texts = []
-        self.ax.lines.clear()
         self.patches.clear()
-        self.patches.add_rect(0, 0, self.width, self.height, {
-            'facecolor': to_plt_color(args)
-        })
+        self.patches.add_rect(0, 0, self.width, self.height,
+                              get_style(facecolor=to_plt_color(args)))
 
     def fill(self, *args):
         color = to_plt_color(args)
         self._fill = color
+        self._styles = [None, None]
 
     def stroke(self, *args):
         color = to_plt_color(args)
         self._stroke = color
+        self._styles = [None, None]
 
     def strokeSize(self, thickness):
         self._strokeSize = thickness
+        self._styles = [None, None]
 
     def noStroke(self):
         self._stroke = None
+        self._styles = [None, None]
 
     def noFill(self):
         self._fill = None
+        self._styles = [None, None]
+
+    def smooth(self):
+        self._antialiased = True
+        self._styles = [None, None]
 
     def noSmooth(self):
         self._antialiased = False
+        self._styles = [None, None]
 
     def rect(self, x, y, w, h):
+        m = self.matrix
+        if not m.aligned:
+            xy = m.transform([(x, y), (x + w, y), (x + w, y + h), (x, y + h)])
+            self.patches.add_polygon(xy, closed=True, kwargs=self._to_patch_args())
+            return
+        if not m.identity:
+            x0, y0 = m.transform_point(x, y)
+            x1, y1 = m.transform_point(x + w, y + h)
+            x, y, w, h = min(x0, x1), min(y0, y1), abs(x1 - x0), abs(y1 - y0)
         self.patches.add_rect(x, y, w, h, self._to_patch_args())
 
     def ellipse(self, x, y, w, h):
-        self.patches.add_ellipse(x, y, w, h, self._to_patch_args())
+        m = self.matrix
+        if m.identity:
+            self.patches.add_ellipse(x, y, w, h, self._to_patch_args())
+            return
+        if m.aligned:
+            a, b, c, d, e, f = m.affine
+            x, y = m.transform_point(x, y)
+            self.patches.add_ellipse(x, y, abs(a * w), abs(e * h), self._to_patch_args())
+            return
+        x, y, w, h, angle = transform_ellipse(m.matrix, x, y, w, h)
+        self.patches.add_ellipse(x, y, w, h, self._to_patch_args(), angle=angle)
 
     def line(self, x1, y1, x2, y2):
-        self.patches.flush_buffer()
-        line = mlines.Line2D([x1, x2], [y1, y2], **self._to_patch_args(line=True))
-        self.ax.add_line(line)
+        m = self.matrix
+        if not m.identity:
+            x1, y1 = m.transform_point(x1, y1)
+            x2, y2 = m.transform_point(x2, y2)
+        self.patches.add_line(x1, y1, x2, y2, self._to_patch_args(line=True))
+
+    def _to_style_arrays(self, n, fills=None, strokes=None, fill=True):
+        if fills is not None:
+            facecolors = to_plt_colors(fills, n)
+        elif fill and self._fill is not None:
+            facecolors = np.broadcast_to(to_rgba(self._fill), (n, 4))
+        else:
+            facecolors = np.zeros((n, 4))
+        if strokes is not None:
+            edgecolors = to_plt_colors(strokes, n)
+        elif self._stroke is not None:
+            edgecolors = np.broadcast_to(to_rgba(self._stroke), (n, 4))
+        else:
+            edgecolors = np.zeros((n, 4))
+        linewidths = np.full(n, self._strokeSize if strokes is not None or self._stroke is not None else 0,
+                             dtype=float)
+        return facecolors, edgecolors, linewidths, np.full(n, self._antialiased)
+
+    def ellipses(self, xs, ys, ws, hs, fills=None, strokes=None):
+        xs, ys, ws, hs = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=float))
+                                               for v in (xs, ys, ws, hs)])
+        n = len(xs)
+        m = self.matrix
+        offsets = m.transform(np.stack([xs, ys], axis=-1))
+        angles = np.zeros(n)
+        if m.aligned:
+            a, b, c, d, e, f = m.affine
+            ws, hs = np.abs(a * ws), np.abs(e * hs)
+        else:
+            ws, hs, angles = transform_ellipses(m.matrix, ws, hs)
+        self.patches.add_ellipses(offsets, ws, hs, angles,
+                                  self._to_style_arrays(n, fills, strokes))
+
+    def rects(self, xs, ys, ws, hs, fills=None, strokes=None):
+        xs, ys, ws, hs = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=float))
+                                               for v in (xs, ys, ws, hs)])
+        verts = np.stack([np.stack([xs, ys], axis=-1),
+                          np.stack([xs + ws, ys], axis=-1),
+                          np.stack([xs + ws, ys + hs], axis=-1),
+                          np.stack([xs, ys + hs], axis=-1)], axis=1)
+        verts = self.matrix.transform(verts).reshape(-1, 4, 2)
+        self.patches.add_polygons(verts, True, self._to_style_arrays(len(xs), fills, strokes))
+
+    def lines(self, x1s, y1s, x2s, y2s, strokes=None):
+        if strokes is None and self._stroke is None:
+            return
+        x1s, y1s, x2s, y2s = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=float))
+                                                   for v in (x1s, y1s, x2s, y2s)])
+        segments = np.stack([np.stack([x1s, y1s], axis=-1),
+                             np.stack([x2s, y2s], axis=-1)], axis=1)
+        segments = self.matrix.transform(segments).reshape(-1, 2, 2)
+        self.patches.add_lines(segments, self._to_style_arrays(len(x1s), strokes=strokes, fill=False))
+
+    def points(self, xs, ys, strokes=None):
+        # Points are dots of the stroke color with the stroke size as diameter
+        if strokes is None and self._stroke is None:
+            return
+        xs, ys = np.broadcast_arrays(np.atleast_1d(np.asarray(xs, dtype=float)),
+                                     np.atleast_1d(np.asarray(ys, dtype=float)))
+        n = len(xs)
+        facecolors, edgecolors, linewidths, antialiaseds = self._to_style_arrays(n, strokes=strokes)
+        offsets = self.matrix.transform(np.stack([xs, ys], axis=-1))
+        size = np.full(n, float(self._strokeSize))
+        self.patches.add_ellipses(offsets, size, size, np.zeros(n),
+                                  (edgecolors, np.zeros((n, 4)), np.zeros(n), antialiaseds))
 
     def beginShape(self):
-        self._points = []
+        self._vertices.clear()
 
     def vertex(self, x, y):
-        self._points.append((x, y))
+        self._vertices.append(VERTEX, x, y)
+
+    def bezierVertex(self, x2, y2, x3, y3, x4, y4):
+        self._vertices.append(BEZIER, x2, y2, x3, y3, x4, y4)
+
+    def quadraticVertex(self, cx, cy, x3, y3):
+        self._vertices.append(QUADRATIC, cx, cy, x3, y3)
+
+    def curveVertex(self, x, y):
+        self._vertices.append(CURVE, x, y)
+
+    def beginContour(self):
+        self._vertices.append(CONTOUR, 0.0, 0.0)
+
+    def endContour(self):
+        pass
+
+    def curveTolerance(self, tolerance):
+        self._tolerance = tolerance
 
     def endShape(self, mode=None):
-        self.patches.add_polygon([[x, y] for x, y in self._points],
-                                 closed=mode == self.CLOSE,
-                                 kwargs=self._to_patch_args())
+        contours = get_path(self._vertices, self.matrix, self._tolerance)
+        if len(contours) == 0:
+            return
+        if len(contours) == 1:
+            self.patches.add_polygon(contours[0], closed=mode == self.CLOSE,
+                                     kwargs=self._to_patch_args())
+        else:
+            self.patches.add_path(contours, closed=mode == self.CLOSE,
+                                  kwargs=self._to_patch_args())
 
     def size(self, width, height, mode=None):
         if mode is None:
@@ -336,54 +1106,104 @@ class DrawingContext(DrawingContextBase):
         self.ax.set_xlim(0, width)
         self.ax.set_ylim(0, height)
         self.ax.set_aspect(1)
-        builtins.width = width
+        self.namespace['width'] = width
         self.width = width
-        builtins.height = height
+        self.namespace['height'] = height
         self.height = height
 
     def pushMatrix(self):
-        self.patches.flush_buffer()
-        self._transforms.append(self._currentTransform)
-        if self._currentTransform is not None:
-            trans, rotate = self._currentTransform
-            self._currentTransform = (transforms.Affine2D(trans.get_matrix()), transforms.Affine2D(rotate.get_matrix()))
+        self.matrix.push()
 
     def popMatrix(self):
-        self.patches.flush_buffer()
-        self._currentTransform = self._transforms.pop()
+        self.matrix.pop()
 
     def translate(self, dx, dy):
-        self.patches.flush_buffer()
-        trans, rotate = self._getTransform()
-        trans.translate(dx, dy)
+        self.matrix.translate(dx, dy)
 
     def rotate(self, theta):
-        self.patches.flush_buffer()
-        trans, rotate = self._getTransform()
-        rotate.rotate(theta)
+        self.matrix.rotate(theta)
+
+    def scale(self, sx, sy=None):
+        self.matrix.scale(sx, sx if sy is None else sy)
+
+    def applyMatrix(self, n00, n01, n02, n10, n11, n12):
+        self.matrix.apply(np.array([[n00, n01, n02], [n10, n11, n12], [0, 0, 1]], dtype=float))
+
+    def resetMatrix(self):
+        self.matrix.reset()
+
+    def loadPixels(self):
+        # pixels is a layer of its own, drawn where updatePixels() is called
+        shape = (int(math.ceil(self.height)), int(math.ceil(self.width)), 4)
+        if self.pixels is None or self.pixels.shape != shape:
+            self.pixels = np.zeros(shape, dtype=np.uint8)
+        self.namespace['pixels'] = self.pixels
 
-    def _getTransform(self):
-        if self._currentTransform is None:
-            self._currentTransform = (transforms.Affine2D(), transforms.Affine2D())
-        return self._currentTransform
+    def updatePixels(self):
+        if self.pixels is None:
+            return
+        self._pixels_version += 1
+        h, w = self.pixels.shape[:2]
+        self.patches.add_image(self.pixels, (0, w, h, 0), self._pixels_version)
+
+    def loadImage(self, path):
+        return load_image(path)
+
+    def image(self, img, x, y, w=None, h=None):
+        w = img.width if w is None else w
+        h = img.height if h is None else h
+        if not self.matrix.aligned:
+            # Rotated or sheared images are drawn through the transform
+            self.patches.add_image(img.pixels, (x, x + w, y + h, y), affine=self.matrix.affine)
+            return
+        (x0, y0), (x1, y1) = self.matrix.transform([(x, y), (x + w, y + h)]).tolist()
+        self.patches.add_image(img.pixels, (x0, x1, y1, y0))
 
     def createFont(self, name, size=None, smooth=None, charset=None):
-        pass
+        return PFont(name, size)
 
-    def textAlign(self, alignX, alignY):
+    def textAlign(self, alignX, alignY=None):
         halign = {self.LEFT: 'left', self.CENTER: 'center', self.RIGHT: 'right'}
         valign = {self.TOP: 'top', self.CENTER: 'center', self.BOTTOM: 'bottom', self.BASELINE: 'baseline'}
         self._textAlignX = halign[alignX]
         self._textAlignY = 'baseline' if alignY is None else valign[alignY]
 
+    def textFont(self, which, size=None):
+        self._textFont = to_font(which)
+        if size is not None:
+            self._textSize = size
+
+    def textSize(self, size):
+        self._textSize = size
+
+    def textLeading(self, leading):
+        self._textLeading = leading
+
+    def _to_text_args(self):
+        name = None
+        size = self._textSize
+        if self._textFont is not None:
+            name = self._textFont.name
+            if size is None:
+                size = self._textFont.size
+        fontproperties = get_font_properties(name, size)
+        args = {
+            'color': self._fill,
+            'horizontalalignment': self._textAlignX,
+            'verticalalignment': self._textAlignY,
+            'fontproperties': fontproperties,
+        }
+        if self._textLeading is not None:
+            args['linespacing'] = self._textLeading / fontproperties.get_size_in_points()
+        # The y axis is inverted, so clockwise rotations in the sketch are
+        # negative angles on screen
+        args['rotation'] = 0.0 if self.matrix.aligned else -math.degrees(self.matrix.rotation())
+        return get_style(**args)
+
     def text(self, *args):
-        self.patches.flush_buffer()
         if len(args) == 3:
-            t = self.ax.text(args[1], args[2], args[0],
-                             color=self._fill,
-                             horizontalalignment=self._textAlignX,
-                             verticalalignment=self._textAlignY)
-            self.texts.append(t)
+            x, y = self.matrix.transform_point(args[1], args[2])
+            self.patches.add_text(x, y, str(args[0]), self._to_text_args())
         else:
             assert False
 
@@ -432,6 +1252,11 @@ class DrawingContextProxy(DrawingContextBase):
             return
         self.base.noFill()
 
+    def smooth(self):
+        if self.base is None:
+            return
+        self.base.smooth()
+
     def noSmooth(self):
         if self.base is None:
             return
@@ -452,6 +1277,26 @@ class DrawingContextProxy(DrawingContextBase):
             return
         self.base.line(x1, y1, x2, y2)
 
+    def ellipses(self, xs, ys, ws, hs, fills=None, strokes=None):
+        if self.base is None:
+            return
+        self.base.ellipses(xs, ys, ws, hs, fills=fills, strokes=strokes)
+
+    def rects(self, xs, ys, ws, hs, fills=None, strokes=None):
+        if self.base is None:
+            return
+        self.base.rects(xs, ys, ws, hs, fills=fills, strokes=strokes)
+
+    def lines(self, x1s, y1s, x2s, y2s, strokes=None):
+        if self.base is None:
+            return
+        self.base.lines(x1s, y1s, x2s, y2s, strokes=strokes)
+
+    def points(self, xs, ys, strokes=None):
+        if self.base is None:
+            return
+        self.base.points(xs, ys, strokes=strokes)
+
     def beginShape(self):
         if self.base is None:
             return
@@ -462,6 +1307,36 @@ class DrawingContextProxy(DrawingContextBase):
             return
         self.base.vertex(x, y)
 
+    def bezierVertex(self, x2, y2, x3, y3, x4, y4):
+        if self.base is None:
+            return
+        self.base.bezierVertex(x2, y2, x3, y3, x4, y4)
+
+    def quadraticVertex(self, cx, cy, x3, y3):
+        if self.base is None:
+            return
+        self.base.quadraticVertex(cx, cy, x3, y3)
+
+    def curveVertex(self, x, y):
+        if self.base is None:
+            return
+        self.base.curveVertex(x, y)
+
+    def beginContour(self):
+        if self.base is None:
+            return
+        self.base.beginContour()
+
+    def endContour(self):
+        if self.base is None:
+            return
+        self.base.endContour()
+
+    def curveTolerance(self, tolerance):
+        if self.base is None:
+            return
+        self.base.curveTolerance(tolerance)
+
     def endShape(self, mode=None):
         if self.base is None:
             return
@@ -469,8 +1344,8 @@ class DrawingContextProxy(DrawingContextBase):
 
     def size(self, width, height, mode=None):
         if self.base is None:
-            builtins.width = width
-            builtins.height = height
+            self.namespace['width'] = width
+            self.namespace['height'] = height
             return
         self.base.size(width, height, mode)
 
@@ -494,31 +1369,73 @@ class DrawingContextProxy(DrawingContextBase):
             return
         self.base.rotate(theta)
 
-    def createFont(self, name, size=None, smooth=None, charset=None):
+    def scale(self, sx, sy=None):
         if self.base is None:
-            return None
-        return self.base.createFont(name, size, smooth, charset)
+            return
+        self.base.scale(sx, sy)
+
+    def applyMatrix(self, n00, n01, n02, n10, n11, n12):
+        if self.base is None:
+            return
+        self.base.applyMatrix(n00, n01, n02, n10, n11, n12)
+
+    def resetMatrix(self):
+        if self.base is None:
+            return
+        self.base.resetMatrix()
+
+    def loadPixels(self):
+        if self.base is None:
+            # Simulated frames still see a pixels array
+            if 'pixels' not in self.namespace:
+                shape = (int(math.ceil(self.namespace['height'])),
+                         int(math.ceil(self.namespace['width'])), 4)
+                self.namespace['pixels'] = np.zeros(shape, dtype=np.uint8)
+            return
+        self.base.loadPixels()
+
+    def updatePixels(self):
+        if self.base is None:
+            return
+        self.base.updatePixels()
+
+    def loadImage(self, path):
+        return load_image(path)
+
+    def image(self, img, x, y, w=None, h=None):
+        if self.base is None:
+            return
+        self.base.image(img, x, y, w, h)
+
+    def createFont(self, name, size=None, smooth=None, charset=None):
+        return PFont(name, size)
 
     def textAlign(self, alignX, alignY=None):
         if self.base is None:
             return
         self.base.textAlign(alignX, alignY)
 
-    def text(self, *args):
+    def textFont(self, which, size=None):
         if self.base is None:
             return
-        self.base.text(*args)
+        self.base.textFont(which, size)
 
-def generate_functions(ctx):
-    def textFont_(which, size=None):
-        pass
+    def textSize(self, size):
+        if self.base is None:
+            return
+        self.base.textSize(size)
 
-    def textSize_(size):
-        pass
+    def textLeading(self, leading):
+        if self.base is None:
+            return
+        self.base.textLeading(leading)
 
-    def textLeading_(leading):
-        pass
+    def text(self, *args):
+        if self.base is None:
+            return
+        self.base.text(*args)
 
+def generate_functions(ctx):
     functions = {
         'background': ctx.background,
         'random': random,
@@ -530,21 +1447,39 @@ def generate_functions(ctx):
         'rect': ctx.rect,
         'ellipse': ctx.ellipse,
         'line': ctx.line,
+        'ellipses': ctx.ellipses,
+        'rects': ctx.rects,
+        'lines': ctx.lines,
+        'points': ctx.points,
         'beginShape': ctx.beginShape,
         'vertex': ctx.vertex,
         'endShape': ctx.endShape,
+        'bezierVertex': ctx.bezierVertex,
+        'quadraticVertex': ctx.quadraticVertex,
+        'curveVertex': ctx.curveVertex,
+        'beginContour': ctx.beginContour,
+        'endContour': ctx.endContour,
+        'curveTolerance': ctx.curveTolerance,
         'size': ctx.size,
+        'smooth': ctx.smooth,
         'noSmooth': ctx.noSmooth,
         'pushMatrix': ctx.pushMatrix,
         'popMatrix': ctx.popMatrix,
         'translate': ctx.translate,
         'rotate': ctx.rotate,
+        'scale': ctx.scale,
+        'applyMatrix': ctx.applyMatrix,
+        'resetMatrix': ctx.resetMatrix,
+        'loadPixels': ctx.loadPixels,
+        'updatePixels': ctx.updatePixels,
+        'loadImage': ctx.loadImage,
+        'image': ctx.image,
         'radians': radians,
         'createFont': ctx.createFont,
         'textAlign': ctx.textAlign,
-        'textFont': textFont_,
-        'textSize': textSize_,
-        'textLeading': textLeading_,
+        'textFont': ctx.textFont,
+        'textSize': ctx.textSize,
+        'textLeading': ctx.textLeading,
         'text': ctx.text,
         'cos': cos,
         'sin': sin,
@@ -0,0 +1,79 @@
+import threading
+from collections import deque
+
+MOTION = ('mouseMoved', 'mouseDragged')
+
+
+class EventQueue:
+    def __init__(self, maxlen=64):
+        # Input received between two frames is queued and handed to the
+        # sketch just before draw(), on the thread which runs the sketch
+        self.maxlen = maxlen
+        self._events = deque()
+        self._lock = threading.Lock()
+        self.dispatched = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._events)
+
+    def post(self, name, x=None, y=None, key=None, button=None):
+        with self._lock:
+            if name in MOTION and len(self._events) > 0 and self._events[-1][0] == name:
+                # Only the latest position of a motion matters
+                self._events[-1] = (name, x, y, key, button)
+                self.coalesced += 1
+                return
+            if len(self._events) >= self.maxlen:
+                self._events.popleft()
+                self.dropped += 1
+            self._events.append((name, x, y, key, button))
+
+    def counts(self):
+        # Events dispatched and dropped since the last call
+        with self._lock:
+            counts = (self.dispatched, self.dropped)
+            self.dispatched = 0
+            self.dropped = 0
+        return counts
+
+    def dispatch(self, ctx):
+        ctx['pmouseX'] = ctx['mouseX']
+        ctx['pmouseY'] = ctx['mouseY']
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            self.dispatched += len(events)
+        for name, x, y, key, button in events:
+            if x is not None and y is not None:
+                ctx['mouseX'] = x
+                ctx['mouseY'] = y
+            if key is not None:
+                ctx['key'] = key
+            if button is not None:
+                ctx['mouseButton'] = button
+            if name in ('mousePressed', 'mouseReleased'):
+                ctx['isMousePressed'] = name == 'mousePressed'
+                if not callable(ctx.get('mousePressed')):
+                    # Like in Processing, mousePressed is also the state of
+                    # the button unless the sketch defines the handler
+                    ctx['mousePressed'] = ctx['isMousePressed']
+            handler = ctx.get(name)
+            if callable(handler):
+                handler()
+
+
+def connect(canvas, events):
+    def on_key(name):
+        return lambda event: events.post(name, key=event.key)
+    def on_button(name):
+        return lambda event: events.post(name, event.xdata, event.ydata, button=event.button)
+    def on_motion(event):
+        events.post('mouseMoved' if event.button is None else 'mouseDragged',
+                    event.xdata, event.ydata, button=event.button)
+    return [canvas.mpl_connect('key_press_event', on_key('keyPressed')),
+            canvas.mpl_connect('key_release_event', on_key('keyReleased')),
+            canvas.mpl_connect('button_press_event', on_button('mousePressed')),
+            canvas.mpl_connect('button_release_event', on_button('mouseReleased')),
+            canvas.mpl_connect('motion_notify_event', on_motion)]
@@ -0,0 +1,114 @@
+import os
+import subprocess
+import time
+import numpy as np
+import matplotlib
+
+
+class ExportStats:
+    def __init__(self, path):
+        self.path = path
+        self.frames = 0
+        self.elapsed = 0.0
+        self.max_frame_time = 0.0
+
+    def add(self, seconds):
+        self.frames += 1
+        self.elapsed += seconds
+        self.max_frame_time = max(self.max_frame_time, seconds)
+
+    @property
+    def fps(self):
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mean_frame_time(self):
+        return self.elapsed / self.frames if self.frames > 0 else 0.0
+
+    def __repr__(self):
+        return 'ExportStats(path={!r}, frames={}, elapsed={:.3f}s, fps={:.1f}, max_frame_time={:.4f}s)'.format(
+            self.path, self.frames, self.elapsed, self.fps, self.max_frame_time)
+
+
+class PNGSequenceWriter:
+    def __init__(self, path, framerate):
+        if '{' not in path:
+            root, ext = os.path.splitext(path)
+            if ext.lower() == '.png':
+                path = root + '{:05d}' + ext
+            else:
+                path = os.path.join(path, 'frame{:05d}.png')
+        dirname = os.path.dirname(path)
+        if len(dirname) > 0:
+            os.makedirs(dirname, exist_ok=True)
+        self.pattern = path
+        self.index = 0
+
+    def write(self, rgba):
+        from PIL import Image
+        Image.fromarray(rgba, 'RGBA').save(self.pattern.format(self.index))
+        self.index += 1
+
+    def close(self):
+        pass
+
+
+class FFmpegWriter:
+    def __init__(self, path, framerate, format):
+        self.path = path
+        self.framerate = framerate
+        self.format = format
+        self.process = None
+
+    def _open(self, width, height):
+        # Odd dimensions are not accepted by most encoders
+        filters = 'pad=ceil(iw/2)*2:ceil(ih/2)*2'
+        if self.format == 'gif':
+            # A palette per frame keeps the encoder from buffering the video
+            filters = 'split[a][b];[a]palettegen=stats_mode=single[p];[b][p]paletteuse=new=1'
+        args = [matplotlib.rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'rgba',
+                '-s', '{}x{}'.format(width, height), '-r', str(self.framerate),
+                '-i', 'pipe:', '-vf', filters]
+        if self.format == 'mp4':
+            args += ['-vcodec', 'h264', '-pix_fmt', 'yuv420p']
+        args.append(self.path)
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE)
+
+    def write(self, rgba):
+        if self.process is None:
+            self._open(rgba.shape[1], rgba.shape[0])
+        self.process.stdin.write(np.ascontiguousarray(rgba).tobytes())
+
+    def close(self):
+        if self.process is None:
+            return
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError('ffmpeg exited with status {}'.format(self.process.returncode))
+
+
+def create_writer(path, format, framerate):
+    if format is None:
+        ext = os.path.splitext(path)[1].lower().lstrip('.')
+        format = ext if ext in ('mp4', 'gif', 'png') else 'png'
+    if format == 'png':
+        return PNGSequenceWriter(path, framerate)
+    if format in ('mp4', 'gif'):
+        return FFmpegWriter(path, framerate, format)
+    raise ValueError('Unknown format: {}'.format(format))
+
+
+def write_frames(writer, frames, stats, progress=None):
+    try:
+        startt = time.perf_counter()
+        for rgba in frames:
+            writer.write(rgba)
+            endt = time.perf_counter()
+            stats.add(endt - startt)
+            if progress is not None:
+                progress(stats.frames - 1, endt - startt)
+            startt = endt
+    finally:
+        writer.close()
+    return stats
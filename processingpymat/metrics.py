@@ -0,0 +1,77 @@
+import csv
+from collections import deque
+
+
+class Counters:
+    NAMES = ['created', 'reused', 'removed', 'merges', 'teardowns']
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.created = 0
+        self.reused = 0
+        self.removed = 0
+        self.merges = 0
+        self.teardowns = 0
+
+    def to_dict(self):
+        return dict([(name, getattr(self, name)) for name in self.NAMES])
+
+
+class FrameMetrics:
+    FIELDS = ['frame', 'skipped', 'simulate', 'draw', 'flush', 'render',
+              'blitted', 'static', 'events', 'dropped'] + Counters.NAMES
+
+    def __init__(self, size=1000):
+        self.records = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def clear(self):
+        self.records.clear()
+
+    def add(self, frame, skipped=0, simulate=0.0, draw=0.0, flush=0.0, events=0, dropped=0,
+            counters=None):
+        record = dict.fromkeys(self.FIELDS, 0)
+        record.update({'frame': frame, 'skipped': skipped, 'simulate': simulate,
+                       'draw': draw, 'flush': flush, 'render': 0.0, 'events': events,
+                       'dropped': dropped})
+        if counters is not None:
+            record.update(counters.to_dict())
+        self.records.append(record)
+        return record
+
+    def set_render(self, seconds, blitted=0, static=0):
+        if len(self.records) == 0:
+            return
+        self.records[-1]['render'] = seconds
+        self.records[-1]['blitted'] = blitted
+        self.records[-1]['static'] = static
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(list(self.records), columns=self.FIELDS)
+
+    def to_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+    def __repr__(self):
+        return 'FrameMetrics({} frames)'.format(len(self.records))
+
+
+def format_record(record):
+    return ('Frame {frame}: draw={draw:.4f}s flush={flush:.4f}s render={render:.4f}s '
+            'skipped={skipped} created={created} reused={reused} removed={removed} '
+            'blitted={blitted} static={static} events={events} dropped={dropped} '
+            'merges={merges} teardowns={teardowns}').format(**record)
@@ -0,0 +1,164 @@
+import math
+import random as rand
+import types
+from itertools import chain
+import numpy as np
+
+
+def _fade(t):
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+def _grad(h, x, y, z):
+    h = h & 15
+    u = x if h < 8 else y
+    v = y if h < 4 else (x if h == 12 or h == 14 else z)
+    return (u if h & 1 == 0 else -u) + (v if h & 2 == 0 else -v)
+
+def _grads(h, x, y, z):
+    h = h & 15
+    u = np.where(h < 8, x, y)
+    v = np.where(h < 4, y, np.where((h == 12) | (h == 14), x, z))
+    return np.where(h & 1, -u, u) + np.where(h & 2, -v, v)
+
+
+class Noise:
+    def __init__(self, seed=None, source=None):
+        self.octaves = 4
+        self.falloff = 0.5
+        self._source = rand if source is None else source
+        self._perm = None
+        if seed is not None:
+            self.seed(seed)
+
+    def seed(self, seed=None):
+        # The permutation table is doubled so that lookups never wrap
+        state = np.random.RandomState(self._source.getrandbits(32) if seed is None
+                                      else seed)
+        perm = state.permutation(256)
+        self._perm = np.concatenate([perm, perm])
+        self._perm_list = self._perm.tolist()
+
+    def detail(self, lod, falloff=None):
+        if lod > 0:
+            self.octaves = lod
+        if falloff is not None and falloff > 0:
+            self.falloff = falloff
+
+    def noise(self, x, y=0, z=0):
+        # Sum of octaves of improved Perlin noise in [0, 1], weighted like
+        # the noise() of Processing
+        if self._perm is None:
+            self.seed()
+        if np.ndim(x) > 0 or np.ndim(y) > 0 or np.ndim(z) > 0:
+            return self._noises(x, y, z)
+        result = 0.0
+        amplitude = 0.5
+        for i in range(self.octaves):
+            result += amplitude * (self._perlin(x, y, z) + 1) / 2
+            amplitude *= self.falloff
+            x, y, z = x * 2, y * 2, z * 2
+        return result
+
+    def _perlin(self, x, y, z):
+        p = self._perm_list
+        fx, fy, fz = math.floor(x), math.floor(y), math.floor(z)
+        xi, yi, zi = int(fx) & 255, int(fy) & 255, int(fz) & 255
+        x, y, z = x - fx, y - fy, z - fz
+        u, v, w = _fade(x), _fade(y), _fade(z)
+        a = p[xi] + yi
+        aa = p[a] + zi
+        ab = p[a + 1] + zi
+        b = p[xi + 1] + yi
+        ba = p[b] + zi
+        bb = p[b + 1] + zi
+        x1 = _grad(p[aa], x, y, z) + u * (_grad(p[ba], x - 1, y, z) - _grad(p[aa], x, y, z))
+        x2 = _grad(p[ab], x, y - 1, z) + u * (_grad(p[bb], x - 1, y - 1, z) - _grad(p[ab], x, y - 1, z))
+        y1 = x1 + v * (x2 - x1)
+        x3 = _grad(p[aa + 1], x, y, z - 1) + u * (_grad(p[ba + 1], x - 1, y, z - 1) -
+                                                  _grad(p[aa + 1], x, y, z - 1))
+        x4 = _grad(p[ab + 1], x, y - 1, z - 1) + u * (_grad(p[bb + 1], x - 1, y - 1, z - 1) -
+                                                      _grad(p[ab + 1], x, y - 1, z - 1))
+        y2 = x3 + v * (x4 - x3)
+        return y1 + w * (y2 - y1)
+
+    def _noises(self, x, y, z):
+        x, y, z = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float),
+                                      np.asarray(z, dtype=float))
+        result = np.zeros(x.shape)
+        amplitude = 0.5
+        for i in range(self.octaves):
+            result += amplitude * (self._perlins(x, y, z) + 1) / 2
+            amplitude *= self.falloff
+            x, y, z = x * 2, y * 2, z * 2
+        return result
+
+    def _perlins(self, x, y, z):
+        p = self._perm
+        fx, fy, fz = np.floor(x), np.floor(y), np.floor(z)
+        xi, yi, zi = fx.astype(int) & 255, fy.astype(int) & 255, fz.astype(int) & 255
+        x, y, z = x - fx, y - fy, z - fz
+        u, v, w = _fade(x), _fade(y), _fade(z)
+        a = p[xi] + yi
+        aa = p[a] + zi
+        ab = p[a + 1] + zi
+        b = p[xi + 1] + yi
+        ba = p[b] + zi
+        bb = p[b + 1] + zi
+        x1 = _grads(p[aa], x, y, z) + u * (_grads(p[ba], x - 1, y, z) - _grads(p[aa], x, y, z))
+        x2 = _grads(p[ab], x, y - 1, z) + u * (_grads(p[bb], x - 1, y - 1, z) -
+                                               _grads(p[ab], x, y - 1, z))
+        y1 = x1 + v * (x2 - x1)
+        x3 = _grads(p[aa + 1], x, y, z - 1) + u * (_grads(p[ba + 1], x - 1, y, z - 1) -
+                                                   _grads(p[aa + 1], x, y, z - 1))
+        x4 = _grads(p[ab + 1], x, y - 1, z - 1) + u * (_grads(p[bb + 1], x - 1, y - 1, z - 1) -
+                                                       _grads(p[ab + 1], x, y - 1, z - 1))
+        y2 = x3 + v * (x4 - x3)
+        return y1 + w * (y2 - y1)
+
+
+class RandomSource:
+    def __init__(self, block=0, seed=None):
+        # With a block size, scalar values are drawn from NumPy a block at a
+        # time and handed out by a C-level iterator
+        self.block = block
+        self.generator = rand.Random(seed)
+        self._state = None if seed is None else np.random.RandomState(seed)
+        self._reset()
+
+    def seed(self, seed):
+        self.generator.seed(seed)
+        self._state = np.random.RandomState(seed)
+        self._reset()
+
+    def _reset(self):
+        if self.block > 0:
+            self._next = chain.from_iterable(iter(self._refill, None)).__next__
+        else:
+            self._next = self.generator.random
+
+    def _refill(self):
+        if self._state is None:
+            self._state = np.random.RandomState(self.generator.getrandbits(32))
+        return self._state.random_sample(self.block).tolist()
+
+    def random(self, *args):
+        if len(args) == 0:
+            return self._next()
+        elif len(args) == 1:
+            return self._next() * args[0]
+        elif len(args) == 2:
+            return self._next() * (args[1] - args[0]) + args[0]
+
+
+def seeded_numpy(seed):
+    # NumPy as seen by a seeded sketch: np.random is bound to a RandomState
+    # of its own, so the global state of the interpreter is left alone
+    state = np.random.RandomState(seed)
+    random = types.ModuleType('numpy.random')
+    random.__dict__.update(np.random.__dict__)
+    random.__dict__.update({name: getattr(state, name) for name in dir(state)
+                            if not name.startswith('_') and hasattr(np.random, name)})
+    module = types.ModuleType('numpy')
+    module.__dict__.update(np.__dict__)
+    module.random = random
+    return module
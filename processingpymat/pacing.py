@@ -0,0 +1,63 @@
+import time
+from collections import deque
+
+
+class Pacer:
+    def __init__(self, framerate=60, realtime=True, maxskip=10, window=30,
+                 clock=time.perf_counter):
+        self.framerate = framerate
+        self.realtime = realtime
+        self.maxskip = maxskip
+        self.clock = clock
+        self.frameCount = 0
+        self._elapsed = 0.0
+        self._rendered = deque(maxlen=window)
+        self._start = clock()
+        self.rebase()
+
+    def rebase(self):
+        self._origin_time = self.clock()
+        self._origin_frame = self.frameCount
+
+    def frameRate(self, fps=None):
+        if fps is not None and fps > 0:
+            self.framerate = fps
+            self.rebase()
+        return self.fps
+
+    def interval(self, skipframes=0):
+        return int(1000 / (self.framerate / (1 + skipframes)))
+
+    def behind(self, skipframes=0):
+        # Number of frames to simulate without rendering so that the sketch
+        # catches up with the wall clock
+        if not self.realtime or self.maxskip <= 0:
+            return 0
+        expected = self._origin_frame + int((self.clock() - self._origin_time) * self.framerate)
+        behind = expected - self.frameCount - 1 - skipframes
+        if behind > self.maxskip:
+            # Too far behind to catch up, so the remaining lag is dropped
+            self._origin_time += (behind - self.maxskip) / self.framerate
+            behind = self.maxskip
+        return max(0, behind)
+
+    def tick(self):
+        if self.frameCount > 0:
+            self._elapsed += 1 / self.framerate
+        self.frameCount += 1
+        return self.frameCount
+
+    def rendered(self):
+        self._rendered.append(self.clock())
+
+    @property
+    def fps(self):
+        if len(self._rendered) < 2 or self._rendered[-1] == self._rendered[0]:
+            return float(self.framerate)
+        return (len(self._rendered) - 1) / (self._rendered[-1] - self._rendered[0])
+
+    def millis(self):
+        if not self.realtime:
+            # Offline renders follow the frame clock so they stay reproducible
+            return int(self._elapsed * 1000)
+        return int((self.clock() - self._start) * 1000)
@@ -0,0 +1,58 @@
+import queue
+import threading
+
+
+class FramePipeline:
+    def __init__(self, run, depth=1):
+        # draw() runs on a worker thread which records up to depth frames
+        # ahead of the one being rendered
+        self.run = run
+        self.depth = depth
+        self._requests = queue.Queue()
+        self._frames = queue.Queue(maxsize=depth)
+        self._pending = 0
+        self._stopped = False
+        # The worker exits on the first exception of the sketch, which is
+        # raised again by every later call instead of waiting for it
+        self.error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request(self, skipframes):
+        if self.error is not None:
+            raise self.error
+        self._pending += 1
+        self._requests.put(skipframes)
+
+    def next(self):
+        if self.error is not None and self._frames.empty():
+            raise self.error
+        result = self._frames.get()
+        self._pending -= 1
+        if isinstance(result, BaseException):
+            self.stop()
+            raise result
+        return result
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        self._requests.put(None)
+
+    def _run(self):
+        while True:
+            skipframes = self._requests.get()
+            if skipframes is None:
+                return
+            try:
+                result = self.run.record_frame(skipframes)
+            except BaseException as e:
+                self.error = e
+                self._frames.put(e)
+                return
+            self._frames.put(result)
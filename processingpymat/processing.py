@@ -1,20 +1,425 @@
-import builtins
-from datetime import datetime, timedelta
+import functools
+import math
+import multiprocessing
+import random as rand
+import threading
+import time
+from collections import deque
 from .drawing import DrawingContextProxy, DrawingContext, generate_functions
-import matplotlib.pyplot as plt
+from .raster import RasterContext
+from .recording import RecordingContext
+from .events import EventQueue, connect as connect_events
+from .export import ExportStats, create_writer, write_frames
+from .metrics import FrameMetrics, format_record
+from .noise import Noise, RandomSource, seeded_numpy
+from .pacing import Pacer
+from .pipeline import FramePipeline
+import numpy as np
 import matplotlib.animation as animation
-from IPython.display import HTML
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.transforms import Bbox
+
+CODE_CACHE_SIZE = 32
+
+@functools.lru_cache(maxsize=CODE_CACHE_SIZE)
+def compile_sketch(cell):
+    # Re-running a cell reuses the code object compiled for the same source,
+    # and only the recently run versions of cells are kept
+    return compile(cell, '<sketch>', 'exec')
+
+# Process and render options of a forked worker, which inherits them instead
+# of pickling the notebook namespace
+_worker_state = None
+
+def _init_worker(state):
+    global _worker_state
+    _worker_state = state
+
+def _render_chunk(chunk):
+    process, skipframes, figsize, renderer, dpi, seed, framerate = _worker_state
+    start, stop = chunk
+    # The worker has a random state of its own, which is seeded for every
+    # chunk for sketches drawing from the random modules directly
+    rand.seed(seed)
+    np.random.seed(seed)
+    return [rgba.copy() for rgba in process._render_frames(start, stop, skipframes, figsize,
+                                                           renderer, dpi, seed, framerate)]
+
+
+PREWARM_SKETCH = '''
+def draw():
+    background(255)
+    fill(255, 0, 0)
+    rect(10, 10, 30, 30)
+    ellipse(50, 50, 20, 20)
+    line(0, 0, 100, 100)
+    text('prewarm', 10, 90)
+'''
+
+def prewarm(renderers=('patch', 'raster'), figsize=(100, 100)):
+    # Pays for pyplot and its backend, the first figure, the font cache and
+    # the drawing caches ahead of the first sketch
+    import matplotlib.pyplot as plt
+    if threading.current_thread() is threading.main_thread():
+        plt.close(plt.figure())
+    else:
+        # GUI backends may only create figures on the main thread
+        plt._get_backend_mod()
+    for renderer in renderers:
+        for rgba in Processing(PREWARM_SKETCH, {})._render_frames(0, 2, 0, figsize, renderer, 100):
+            pass
+
+
+class ProcessingAnimation(animation.FuncAnimation):
+    def __init__(self, fig, func, metrics, context, debug=False, static_after=30, **kwargs):
+        self._metrics = metrics
+        self._context = context
+        self._debug = debug
+        self._static_after = static_after
+        # Artists at the bottom of the scene which have not changed for
+        # static_after frames are drawn once into a cached layer background
+        self._ages = {}
+        self._layer = []
+        self._layer_background = None
+        super().__init__(fig, func, **kwargs)
+
+    def _pre_draw(self, framedata, blit):
+        # The background is restored in _post_draw, and only when the frame
+        # has changed
+        pass
+
+    def _post_draw(self, framedata, blit):
+        # The function returns the changed artists only. Frames without
+        # changes are not drawn at all, and otherwise the live part of the
+        # scene is drawn over the background since unchanged artists are
+        # animated too.
+        startt = time.perf_counter()
+        blitted = 0
+        changed = framedata is None or self._context.changed
+        scene = self._context.artists
+        if blit and len(scene) > 0:
+            blitted = self._blit_scene(scene, changed)
+        elif changed:
+            self._fig.canvas.draw_idle()
+        self._metrics.set_render(time.perf_counter() - startt, blitted=blitted,
+                                 static=len(self._layer))
+        if self._debug and len(self._metrics) > 0:
+            print(format_record(self._metrics[-1]))
+
+    def _blit_scene(self, scene, changed):
+        ax = scene[0].axes
+        canvas = ax.figure.canvas
+        view = ax._get_view()
+        # Regions are copied and blitted in whole pixels, so that the edge
+        # column or row which the axes only partly cover is restored too
+        x0, y0, x1, y1 = ax.bbox.extents
+        bbox = Bbox.from_extents(math.floor(x0), math.floor(y0), math.ceil(x1), math.ceil(y1))
+        if ax not in self._blit_cache or self._blit_cache[ax][0] != view:
+            # The canvas holds a full draw without the animated artists
+            self._blit_cache[ax] = (view, canvas.copy_from_bbox(bbox))
+            self._layer = []
+            self._layer_background = None
+            changed = True
+        background = self._blit_cache[ax][1]
+
+        updates = set(self._drawn_artists)
+        self._ages = dict([(a, 0 if a in updates else self._ages.get(a, -1) + 1) for a in scene])
+        static = 0
+        if self._static_after > 0:
+            while static < len(scene) and self._ages[scene[static]] >= self._static_after:
+                static += 1
+        # The layer must stay a prefix of the scene, so an artist which
+        # changes again sends everything above it back to the live layer
+        if self._layer != scene[:static]:
+            self._layer = scene[:static]
+            self._layer_background = None
+            if static > 0:
+                canvas.restore_region(background)
+                for a in self._layer:
+                    ax.draw_artist(a)
+                self._layer_background = canvas.copy_from_bbox(bbox)
+            changed = True
+        if not changed:
+            return 0
+
+        canvas.restore_region(self._layer_background if self._layer_background is not None
+                              else background)
+        live = scene[len(self._layer):]
+        for a in live:
+            ax.draw_artist(a)
+        canvas.blit(bbox)
+        return len(live)
+
+
+class SketchRun:
+    def __init__(self, gctxproxy, gctx, ctx, pacer, recorder=None, metrics_size=1000):
+        # State of one execution of a sketch, so that a live plot is not
+        # disturbed by an export or a recording of the same sketch
+        self.gctxproxy = gctxproxy
+        self.gctx = gctx
+        self.ctx = ctx
+        self.pacer = pacer
+        self.metrics = FrameMetrics(metrics_size)
+        self.events = EventQueue()
+        # In the recording mode the sketch draws into a display list which
+        # is replayed into the renderer only when it differs from the last one
+        self.recorder = recorder
+        self.setup_list = None
+        self.last_list = None
+        self.bindings = []
+        self.bound = True
+
+    def step(self, frame, skipframes):
+        startt = time.perf_counter()
+        for i in range(skipframes):
+            self.draw(None)
+        simulate = time.perf_counter() - startt
+        draw, flush = self.draw(self.gctx)
+        self.pacer.rendered()
+        events, dropped = self.events.counts()
+        self.metrics.add(frame, skipped=skipframes, simulate=simulate, draw=draw,
+                         flush=flush, events=events, dropped=dropped, counters=self.gctx.counters)
+
+    def step_pipelined(self, pipeline, frame, skipframes):
+        # The worker records the next frames while this one is rendered, and
+        # blocks once it is depth frames ahead
+        if frame == 0:
+            pipeline.request(0)
+        while pipeline.pending <= pipeline.depth:
+            pipeline.request(skipframes)
+        skipped, display_list, simulate, draw = pipeline.next()
+        startt = time.perf_counter()
+        self.gctx.clear()
+        self.replay(display_list)
+        self.gctx.flush()
+        flush = time.perf_counter() - startt
+        self.pacer.rendered()
+        events, dropped = self.events.counts()
+        self.metrics.add(frame, skipped=skipped, simulate=simulate, draw=draw,
+                         flush=flush, events=events, dropped=dropped, counters=self.gctx.counters)
+
+    def record_frame(self, skipframes):
+        ctx = self.ctx
+        startt = time.perf_counter()
+        for i in range(skipframes):
+            self.draw(None)
+        simulate = time.perf_counter() - startt
+        self.bind(True)
+        self.recorder.clear()
+        self.events.dispatch(ctx)
+        ctx['frameCount'] = self.pacer.tick()
+        startt = time.perf_counter()
+        if 'draw' in ctx:
+            ctx['draw']()
+        return skipframes, self.recorder.display_list, simulate, time.perf_counter() - startt
+
+    def bind(self, bound):
+        if self.bound != bound:
+            self.bound = bound
+            for k, function, simulated in self.bindings:
+                self.ctx[k] = function if bound else simulated
+
+    def replay(self, display_list):
+        # Frames equal to the last one leave the renderer untouched, and the
+        # others are replayed from their first change where the renderer
+        # supports it
+        if display_list != self.last_list:
+            display_list.replay(self.gctx, self.last_list)
+            self.last_list = display_list
+
+    def draw(self, gctx):
+        # Frames are only simulated without a context
+        ctx = self.ctx
+        self.gctxproxy.base = gctx
+        self.bind(gctx is not None)
+        self.gctxproxy.clear()
+        recording = self.recorder is not None and gctx is not None
+        if recording:
+            self.recorder.clear()
+        self.events.dispatch(ctx)
+        ctx['frameCount'] = self.pacer.tick()
+        startt = time.perf_counter()
+        if 'draw' in ctx:
+            ctx['draw']()
+        if recording:
+            self.replay(self.recorder.display_list)
+        drawt = time.perf_counter()
+        self.gctxproxy.flush()
+        return drawt - startt, time.perf_counter() - drawt
 
 
 class Processing:
 
-    def __init__(self, cell, local_ns):
+    def __init__(self, cell, local_ns, metrics_size=1000, recording=False, random_block=0):
         self.cell = cell
         self.local_ns = local_ns
+        self.metrics_size = metrics_size
+        self.random_block = random_block
+        self.recording = recording
+        # The last run started, and the pipeline of the live plot
+        self.run = None
+        self.pipeline = None
+
+    @property
+    def metrics(self):
+        return self.run.metrics if self.run is not None else FrameMetrics(self.metrics_size)
+
+    @property
+    def pacer(self):
+        return self.run.pacer if self.run is not None else None
+
+    @property
+    def recorder(self):
+        return self.run.recorder if self.run is not None else None
+
+    @property
+    def setup_list(self):
+        return self.run.setup_list if self.run is not None else None
 
     def plot(self, fig, ax, figsize=(500, 500), frames=60 * 60 * 30,
              framerate=60, skipframes=0, blit=True, save_count=None,
-             debug=False):
+             debug=False, renderer='patch', realtime=True, maxskip=10,
+             static_after=30, pipeline=False, depth=1):
+        pacer = Pacer(framerate, realtime=realtime, maxskip=maxskip)
+        # With the pipeline, frames are handed over to the renderer as
+        # display lists
+        run = self._start(fig, ax, figsize, renderer, pacer,
+                          recording=self.recording or pipeline)
+        gctx = run.gctx
+        interval = pacer.interval(skipframes)
+        self.pipeline = FramePipeline(run, depth) if pipeline else None
+        pipeline = self.pipeline
+
+        # draw
+        anim = None
+
+        def step_animation(frame):
+            nonlocal interval
+            try:
+                if pipeline is None:
+                    skipped = skipframes + pacer.behind(skipframes) if frame > 0 else 0
+                    run.step(frame, skipped)
+                else:
+                    run.step_pipelined(pipeline, frame, skipframes + pacer.behind(skipframes))
+            except BaseException:
+                # A failing sketch is not run again by the timer
+                if anim is not None and anim.event_source is not None:
+                    anim.event_source.stop()
+                raise
+            if frame == 0:
+                # The wall clock starts with the first frame on screen
+                pacer.rebase()
+            # frameRate() may have been called from draw()
+            if pacer.interval(skipframes) != interval and anim is not None and \
+                    anim.event_source is not None:
+                interval = pacer.interval(skipframes)
+                anim.event_source.interval = interval
+            return gctx.updates
+
+        # Input is queued and dispatched to the sketch just before draw()
+        connect_events(fig.canvas, run.events)
+        if pipeline is not None:
+            fig.canvas.mpl_connect('close_event', lambda event: pipeline.stop())
+
+        anim = ProcessingAnimation(fig, step_animation, run.metrics,
+                                   gctx, debug=debug, static_after=static_after,
+                                   frames=frames if hasattr(frames, '__call__') else (frames // (1 + skipframes)),
+                                   interval=interval,
+                                   save_count=save_count,
+                                   blit=blit)
+        return anim
+
+    def export(self, path, frames=100, format=None, framerate=60, skipframes=0,
+               figsize=(500, 500), renderer='patch', dpi=100, progress=None,
+               jobs=1, seed=None, chunksize=30):
+        # Frames are written as soon as they are rendered, so memory use does
+        # not depend on the number of frames
+        writer = create_writer(path, format, framerate)
+        stats = ExportStats(path)
+        if jobs > 1:
+            renders = self._render_frames_parallel(frames, skipframes, figsize, renderer, dpi,
+                                                   0 if seed is None else seed, jobs, chunksize,
+                                                   framerate)
+        else:
+            renders = self._render_frames(0, frames, skipframes, figsize, renderer, dpi, seed,
+                                          framerate)
+        return write_frames(writer, renders, stats, progress=progress)
+
+    def _render_frames_parallel(self, frames, skipframes, figsize, renderer, dpi, seed,
+                                jobs, chunksize, framerate=60):
+        # Every chunk is rendered by a worker which re-executes the sketch and
+        # fast-forwards to the chunk, so the sketch must only depend on its
+        # seeded random state and the number of frames drawn
+        state = (self, skipframes, figsize, renderer, dpi, seed, framerate)
+        chunks = [(start, min(start + chunksize, frames))
+                  for start in range(0, frames, chunksize)]
+        with multiprocessing.get_context('fork').Pool(jobs, _init_worker, (state,)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                # Bound the number of rendered chunks waiting to be written
+                if len(pending) >= 2 * jobs:
+                    yield from pending.popleft().get()
+                pending.append(pool.apply_async(_render_chunk, (chunk,)))
+            while len(pending) > 0:
+                yield from pending.popleft().get()
+
+    def _render_frames(self, start, stop, skipframes, figsize, renderer, dpi, seed=None,
+                       framerate=60):
+        w, h = figsize
+        fig = Figure(figsize=(w / dpi, h / dpi), dpi=dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.add_axes([0, 0, 1, 1])
+        run = self._start(fig, ax, figsize, renderer, Pacer(framerate, realtime=False),
+                          seed=seed, headless=True)
+        gctx = run.gctx
+        fig.set_size_inches(gctx.width / dpi, gctx.height / dpi)
+        for frame in range(stop):
+            # Frames before the range are only simulated
+            if frame < start:
+                for i in range(1 + (skipframes if frame > 0 else 0)):
+                    run.draw(None)
+                continue
+            run.step(frame, skipframes if frame > 0 else 0)
+            startt = time.perf_counter()
+            if renderer == 'raster':
+                rgba = gctx.to_rgba()
+            else:
+                fig.canvas.draw()
+                rgba = np.asarray(fig.canvas.buffer_rgba())
+            run.metrics.set_render(time.perf_counter() - startt)
+            yield rgba
+
+    def record(self, frames=100, skipframes=0, figsize=(500, 500), seed=None, framerate=60):
+        # Display lists of the setup and of every frame, which can be saved
+        # and replayed into any context later
+        fig = Figure()
+        ax = fig.add_axes([0, 0, 1, 1])
+        run = self._start(fig, ax, figsize, 'patch', Pacer(framerate, realtime=False),
+                          seed=seed, recording=True)
+        display_lists = [run.setup_list]
+        for frame in range(frames):
+            for i in range(skipframes if frame > 0 else 0):
+                run.draw(None)
+            run.draw(run.gctx)
+            display_lists.append(run.recorder.display_list)
+        return display_lists
+
+    def generate(self, skipframes=0, framerate=60, frames=100, blit=True,
+                 save_count=None, debug=False, renderer='patch'):
+        import matplotlib.pyplot as plt
+        from IPython.display import HTML
+        fig = plt.figure()
+        ax = fig.gca()
+        anim = self.plot(fig, ax, skipframes=skipframes, framerate=framerate,
+                         frames=frames, blit=blit, save_count=save_count,
+                         debug=debug, renderer=renderer, realtime=False)
+        return HTML(anim.to_html5_video())
+
+    def _start(self, fig, ax, figsize, renderer, pacer, seed=None, recording=None,
+               headless=False):
+        if recording is None:
+            recording = self.recording
         w, h = figsize
         ax.set_xlim(0, w)
         ax.set_ylim(0, h)
@@ -23,74 +428,62 @@ class Processing:
         ax.set_yticks([], [])
         ax.set_aspect(1)
         gctxproxy = DrawingContextProxy()
-        functions = generate_functions(gctxproxy)
-        w, h = figsize
+        gctx = self._create_context(fig, ax, figsize, renderer, headless)
+        gctxproxy.base = gctx
+        recorder = RecordingContext() if recording else None
+        ctx = {}
+        run = SketchRun(gctxproxy, gctx, ctx, pacer, recorder, self.metrics_size)
+
+        # The API lives in the globals of the sketch. Drawing functions are
+        # bound to the context directly, or to the recorder, and swapped for
+        # the proxy ones while frames are only simulated.
+        functions = generate_functions(recorder if recording else gctx)
         functions['width'] = w
         functions['height'] = h
-        for k, f in functions.items():
-            setattr(builtins, k, f)
+        functions['frameRate'] = pacer.frameRate
+        functions['millis'] = pacer.millis
+        functions['frameCount'] = 0
+        functions.update({'mouseX': 0, 'mouseY': 0, 'pmouseX': 0, 'pmouseY': 0,
+                          'mousePressed': False, 'isMousePressed': False, 'mouseButton': None})
+        simulated = generate_functions(gctxproxy)
+        # Noise and random state belong to the sketch, whether frames are
+        # drawn or simulated, so that sketches running at the same time do
+        # not share the random state of the interpreter
+        random_source = RandomSource(self.random_block, seed)
+        noise = Noise(source=random_source.generator)
+        for api in [functions, simulated]:
+            api.update({'noise': noise.noise, 'noiseSeed': noise.seed,
+                        'noiseDetail': noise.detail, 'random': random_source.random,
+                        'randomSeed': random_source.seed})
+        ctx.update(functions)
+        ctx.update(self.local_ns)
+        if seed is not None and ctx.get('np', np) is np:
+            ctx['np'] = seeded_numpy(seed)
+        run.bindings = [(k, f, simulated[k]) for k, f in functions.items()
+                        if k in simulated and k not in self.local_ns and f is not simulated[k]]
+        gctx.namespace = ctx
+        gctxproxy.namespace = ctx
+        if recording:
+            recorder.namespace = ctx
+        self.run = run
 
         # setup
-        gctx = DrawingContext(fig, ax, figsize=figsize)
-        gctxproxy.base = gctx
-        ctx = {}
-        ctx.update(self.local_ns)
-        exec(self.cell, ctx)
+        exec(compile_sketch(self.cell), ctx)
         if 'setup' in ctx:
             ctx['setup']()
+        if recording:
+            run.setup_list = recorder.display_list
+            run.setup_list.replay(gctx)
 
         ax.invert_yaxis()
+        return run
 
-        # draw
-        def step_animation(frame):
-            # Skip frames
-            if frame > 0:
-                for i in range(skipframes):
-                    gctxproxy.base = None
-                    startt = datetime.now()
-                    gctxproxy.clear()
-                    if 'draw' in ctx:
-                        ctx['draw']()
-                    gctxproxy.flush()
-                    durt = (datetime.now() - startt) / timedelta(seconds=1)
-                    if debug:
-                        print('Draw(frame={}, skipframe={}): duration={} seconds.'.format(frame, i, durt))
-            # Draw
-            gctxproxy.base = gctx
-            startt = datetime.now()
-            gctxproxy.clear()
-            if 'draw' in ctx:
-                ctx['draw']()
-            gctxproxy.flush()
-            durt = (datetime.now() - startt) / timedelta(seconds=1)
-            if debug:
-                print('Draw(frame={}): duration={} seconds.'.format(frame, durt))
-            return gctx.patches.updates
-
-        # handlers
-        if 'keyPressed' in ctx:
-            def keyPressed_(event):
-                builtins.key = event.key
-                ctx['keyPressed']()
-            fig.canvas.mpl_connect('key_press_event', keyPressed_)
-
-        if 'keyReleased' in ctx:
-            def keyReleased_(event):
-                builtins.key = event.key
-                ctx['keyReleased']()
-            fig.canvas.mpl_connect('key_release_event', keyReleased_)
-
-        return animation.FuncAnimation(fig, step_animation,
-                                       frames=frames if hasattr(frames, '__call__') else (frames // (1 + skipframes)),
-                                       interval=int(1000 / (framerate / (1 + skipframes))),
-                                       save_count=save_count,
-                                       blit=blit)
-
-    def generate(self, skipframes=0, framerate=60, frames=100, blit=True,
-                 save_count=None, debug=False):
-        fig = plt.figure()
-        ax = fig.gca()
-        anim = self.plot(fig, ax, skipframes=skipframes, framerate=framerate,
-                         frames=frames, blit=blit, save_count=save_count,
-                         debug=debug)
-        return HTML(anim.to_html5_video())
+    def _create_context(self, fig, ax, figsize, renderer, headless=False):
+        if renderer == 'patch':
+            return DrawingContext(fig, ax, figsize=figsize)
+        if renderer == 'collection':
+            return DrawingContext(fig, ax, figsize=figsize, batched=True)
+        if renderer == 'raster':
+            # A headless render reads the buffer directly
+            return RasterContext(fig, None if headless else ax, figsize=figsize)
+        raise ValueError('Unknown renderer: {}'.format(renderer))
@@ -0,0 +1,569 @@
+import functools
+import math
+import numpy as np
+from .drawing import (DrawingContextBase, MatrixStack, PFont, get_font_properties, load_image,
+                      to_font, to_plt_color, to_plt_colors)
+from .metrics import Counters
+from .shapes import VertexBuffer, VERTEX, BEZIER, QUADRATIC, CURVE, CONTOUR, TOLERANCE, get_path
+
+
+def box_coverage(start, stop, count):
+    # Exact area coverage of the span [start, stop) over unit pixels
+    edges = np.arange(count, dtype=np.float32)
+    coverage = np.minimum(stop, edges + 1)
+    coverage -= np.maximum(start, edges)
+    np.maximum(coverage, 0, out=coverage)
+    return np.minimum(coverage, 1, out=coverage)
+
+@functools.lru_cache(maxsize=256)
+def text_polygons(s, name, size):
+    # Outlines of a string and the size of their extents, flipped to the
+    # y-down canvas. Labels are usually drawn again every frame.
+    from matplotlib.textpath import TextPath
+    path = TextPath((0, 0), s, prop=get_font_properties(name, size))
+    polygons = [xy * (1, -1) for xy in path.to_polygons()]
+    if len(polygons) == 0:
+        return polygons, 0, 0
+    points = np.concatenate(polygons)
+    width, height = points.max(axis=0) - points.min(axis=0)
+    return polygons, width, height
+
+def segment_distance(px, py, x0, y0, x1, y1):
+    dx = x1 - x0
+    dy = y1 - y0
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        return np.hypot(px - x0, py - y0)
+    t = np.clip(((px - x0) * dx + (py - y0) * dy) / length2, 0, 1)
+    return np.hypot(px - x0 - t * dx, py - y0 - t * dy)
+
+def polyline_distance(px, py, xy, closed):
+    points = np.concatenate([xy, xy[:1]]) if closed else xy
+    distance = np.full(px.shape, np.inf, dtype=np.float32)
+    for (x0, y0), (x1, y1) in zip(points[:-1], points[1:]):
+        np.minimum(distance, segment_distance(px, py, x0, y0, x1, y1), out=distance)
+    return distance
+
+def polygon_inside(px, py, polygons, evenodd=False):
+    # Winding number (or crossing parity) accumulated edge by edge
+    winding = np.zeros(px.shape, dtype=np.int32)
+    for xy in polygons:
+        points = np.concatenate([xy, xy[:1]])
+        for (x0, y0), (x1, y1) in zip(points[:-1], points[1:]):
+            if y0 == y1:
+                continue
+            cross = (x1 - x0) * (py - y0) - (px - x0) * (y1 - y0)
+            if evenodd:
+                winding += ((y0 > py) != (y1 > py)) & ((cross > 0) == (y1 > y0))
+            else:
+                winding += (y0 <= py) & (y1 > py) & (cross > 0)
+                winding -= (y0 > py) & (y1 <= py) & (cross < 0)
+    if evenodd:
+        return (winding & 1) == 1
+    return winding != 0
+
+
+class RasterContext(DrawingContextBase):
+    def __init__(self, fig, ax, figsize):
+        # Without axes the context renders headless: nothing is uploaded to
+        # an artist and frames are only read with to_rgba()
+        super().__init__()
+        self.fig = fig
+        self.ax = ax
+        self.canvas_image = None
+        self.updates = []
+        self.counters = Counters()
+        self._antialiased = True
+        self._fill = (1.0, 1.0, 1.0)
+        self._stroke = (0.0, 0.0, 0.0)
+        self._strokeSize = 1
+        self._vertices = VertexBuffer()
+        self._tolerance = TOLERANCE
+        self.matrix = MatrixStack()
+        self._textAlignX = 'left'
+        self._textAlignY = 'baseline'
+        self._textFont = None
+        self._textSize = None
+        self.pixels = None
+        self._resize(*figsize)
+
+    def _resize(self, width, height):
+        self.width, self.height = width, height
+        self.buffer = np.ones((int(math.ceil(height)), int(math.ceil(width)), 3),
+                              dtype=np.float32)
+
+    def to_rgba(self):
+        rgba = np.empty(self.buffer.shape[:2] + (4,), dtype=np.uint8)
+        rgba[:, :, :3] = np.rint(self.buffer * 255)
+        rgba[:, :, 3] = 255
+        return rgba
+
+    def clear(self):
+        self.matrix.reset()
+        self.updates = []
+
+    def snapshot(self):
+        # State after the first commands of a display list, restored when the
+        # next one starts with the same commands instead of replaying them
+        vertices = VertexBuffer()
+        vertices._data = self._vertices._data.copy()
+        vertices.size = self._vertices.size
+        return (self.buffer.copy(), self.width, self.height, self.matrix.matrix,
+                self.matrix.affine, self.matrix.identity, self.matrix.aligned,
+                list(self.matrix._stack), vertices, self._fill, self._stroke, self._strokeSize,
+                self._antialiased, self._tolerance, self._textAlignX, self._textAlignY,
+                self._textFont, self._textSize)
+
+    def restore(self, state):
+        buffer, self.width, self.height = state[:3]
+        if self.buffer.shape == buffer.shape:
+            np.copyto(self.buffer, buffer)
+        else:
+            self.buffer = buffer.copy()
+        (self.matrix.matrix, self.matrix.affine, self.matrix.identity,
+         self.matrix.aligned, stack) = state[3:8]
+        self.matrix._stack = list(stack)
+        vertices = state[8]
+        self._vertices._data = vertices._data.copy()
+        self._vertices.size = vertices.size
+        (self._fill, self._stroke, self._strokeSize, self._antialiased, self._tolerance,
+         self._textAlignX, self._textAlignY, self._textFont, self._textSize) = state[9:]
+
+    def flush(self):
+        if self.ax is None:
+            return
+        rgba = self.to_rgba()
+        if self.canvas_image is None or self.canvas_image.get_array().shape != rgba.shape:
+            if self.canvas_image is not None:
+                self.canvas_image.remove()
+            xlim, ylim = self.ax.get_xlim(), self.ax.get_ylim()
+            self.canvas_image = self.ax.imshow(rgba, extent=(0, self.width, self.height, 0),
+                                        interpolation='nearest')
+            self.ax.set_xlim(*xlim)
+            self.ax.set_ylim(*ylim)
+        elif np.array_equal(self.canvas_image.get_array(), rgba):
+            return
+        else:
+            self.canvas_image.set_data(rgba)
+        self.updates = [self.canvas_image]
+
+    @property
+    def artists(self):
+        return [] if self.canvas_image is None else [self.canvas_image]
+
+    @property
+    def changed(self):
+        return len(self.updates) > 0
+
+    def _transform(self, xy):
+        return self.matrix.transform(xy)
+
+    def _scale(self):
+        if self.matrix.identity:
+            return 1.0
+        return math.sqrt(abs(np.linalg.det(self.matrix.matrix[:2, :2])))
+
+    def _bounds(self, x0, y0, x1, y1):
+        # Pixels of the canvas touched by the given box
+        h, w = self.buffer.shape[:2]
+        c0, r0 = max(int(math.floor(x0)), 0), max(int(math.floor(y0)), 0)
+        c1, r1 = min(int(math.ceil(x1)), w), min(int(math.ceil(y1)), h)
+        if c0 >= c1 or r0 >= r1:
+            return None
+        return slice(r0, r1), slice(c0, c1)
+
+    def _grid(self, xy, margin):
+        # Pixel centers of the canvas region covered by the given points
+        region = self._bounds(xy[:, 0].min() - margin, xy[:, 1].min() - margin,
+                              xy[:, 0].max() + margin, xy[:, 1].max() + margin)
+        if region is None:
+            return None
+        rows, cols = region
+        px, py = np.meshgrid(np.arange(cols.start, cols.stop, dtype=np.float32) + 0.5,
+                             np.arange(rows.start, rows.stop, dtype=np.float32) + 0.5)
+        return region, px, py
+
+    def _blend(self, region, coverage, color):
+        if not self._antialiased:
+            coverage = (coverage > 0.5).astype(np.float32)
+        alpha = coverage * (color[3] if len(color) == 4 else 1.0)
+        target = self.buffer[region]
+        target += (np.asarray(color[:3], dtype=np.float32) - target) * alpha[:, :, np.newaxis]
+
+    def _stroke_width(self):
+        return max(self._strokeSize * self._scale(), 1.0)
+
+    def _fill_polygon(self, xy, closed=True):
+        self._fill_contours([xy], closed)
+
+    def _fill_contours(self, contours, closed=True):
+        margin = self._stroke_width() if self._stroke is not None else 1
+        grid = self._grid(np.concatenate(contours), margin)
+        if grid is None:
+            return
+        region, px, py = grid
+        distance = self._contours_distance(px, py, contours, True)
+        if self._fill is not None:
+            inside = polygon_inside(px, py, contours)
+            coverage = np.clip(np.where(inside, distance, -distance) + 0.5, 0, 1)
+            self._blend(region, coverage, self._fill)
+        if self._stroke is not None:
+            if not closed:
+                distance = self._contours_distance(px, py, contours, False)
+            coverage = np.clip(self._stroke_width() / 2 - distance + 0.5, 0, 1)
+            self._blend(region, coverage, self._stroke)
+
+    def _contours_distance(self, px, py, contours, closed):
+        distance = polyline_distance(px, py, contours[0], closed)
+        for xy in contours[1:]:
+            np.minimum(distance, polyline_distance(px, py, xy, closed), out=distance)
+        return distance
+
+    def background(self, *args):
+        color = to_plt_color(args)
+        if len(color) == 4:
+            self.buffer += (np.asarray(color[:3], dtype=np.float32) - self.buffer) * color[3]
+        else:
+            self.buffer[:, :] = color
+
+    def fill(self, *args):
+        self._fill = to_plt_color(args)
+
+    def stroke(self, *args):
+        self._stroke = to_plt_color(args)
+
+    def strokeSize(self, thickness):
+        self._strokeSize = thickness
+
+    def noStroke(self):
+        self._stroke = None
+
+    def noFill(self):
+        self._fill = None
+
+    def smooth(self):
+        self._antialiased = True
+
+    def noSmooth(self):
+        self._antialiased = False
+
+    def rect(self, x, y, w, h):
+        if not self.matrix.aligned:
+            self._fill_polygon(self._transform([(x, y), (x + w, y), (x + w, y + h), (x, y + h)]))
+            return
+        (x0, y0), (x1, y1) = np.sort(self._transform([(x, y), (x + w, y + h)]), axis=0).tolist()
+        half = self._stroke_width() / 2 if self._stroke is not None else 0
+        region = self._bounds(x0 - half, y0 - half, x1 + half, y1 + half)
+        if region is None:
+            return
+        rows, cols = region
+
+        def coverage(inset):
+            # Exact area of the box shrunk by inset over the pixels of the region
+            return np.outer(box_coverage(y0 + inset - rows.start, y1 - inset - rows.start,
+                                         rows.stop - rows.start),
+                            box_coverage(x0 + inset - cols.start, x1 - inset - cols.start,
+                                         cols.stop - cols.start))
+        if self._fill is not None:
+            self._blend(region, coverage(0), self._fill)
+        if self._stroke is not None:
+            # The stroke band is the box grown by half the weight less the
+            # box shrunk by it, so its corners are mitered like Processing
+            self._blend(region, coverage(-half) - coverage(half), self._stroke)
+
+    def ellipse(self, x, y, w, h):
+        rx, ry = abs(w) / 2, abs(h) / 2
+        if rx == 0 or ry == 0:
+            return
+        strokewidth = self._stroke_width() if self._stroke is not None else 0
+        if self.matrix.aligned:
+            outline = self._aligned_ellipse(x, y, rx, ry, strokewidth + 1)
+        else:
+            outline = self._ellipse(x, y, rx, ry, strokewidth + 1)
+        if outline is None:
+            return
+        region, distance = outline
+        if self._fill is not None:
+            self._blend(region, np.clip(distance + 0.5, 0, 1), self._fill)
+        if self._stroke is not None:
+            coverage = np.clip(strokewidth / 2 - np.abs(distance) + 0.5, 0, 1)
+            self._blend(region, coverage, self._stroke)
+
+    def _ellipse(self, x, y, rx, ry, margin):
+        corners = self._transform([(x - rx, y - ry), (x + rx, y - ry),
+                                   (x + rx, y + ry), (x - rx, y + ry)])
+        grid = self._grid(corners, margin)
+        if grid is None:
+            return None
+        region, px, py = grid
+        inverse = np.linalg.inv(self.matrix.matrix)
+        qx = inverse[0, 0] * px + inverse[0, 1] * py + inverse[0, 2]
+        qy = inverse[1, 0] * px + inverse[1, 1] * py + inverse[1, 2]
+        a = (qx - x) / rx
+        b = (qy - y) / ry
+        r = np.hypot(a, b)
+        # First order distance to the outline in pixels
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gx = (inverse[0, 0] * a / rx + inverse[1, 0] * b / ry) / r
+            gy = (inverse[0, 1] * a / rx + inverse[1, 1] * b / ry) / r
+            distance = np.nan_to_num((1 - r) / np.hypot(gx, gy), nan=np.inf, posinf=np.inf)
+        return region, distance
+
+    def _aligned_ellipse(self, x, y, rx, ry, margin):
+        # Same distance without rotation, from a row and a column of
+        # normalized coordinates broadcast against each other
+        a, b, c, d, e, f = self.matrix.affine
+        cx, cy = a * x + c, e * y + f
+        sx, sy = abs(a) * rx, abs(e) * ry
+        if sx == 0 or sy == 0:
+            return None
+        region = self._bounds(cx - sx - margin, cy - sy - margin, cx + sx + margin, cy + sy + margin)
+        if region is None:
+            return None
+        rows, cols = region
+        u = ((np.arange(cols.start, cols.stop, dtype=np.float32) + 0.5 - cx) / sx)[np.newaxis]
+        v = ((np.arange(rows.start, rows.stop, dtype=np.float32) + 0.5 - cy) / sy)[:, np.newaxis]
+        r = np.hypot(u, v)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distance = np.nan_to_num((1 - r) * r / np.hypot(u / sx, v / sy), nan=np.inf,
+                                     posinf=np.inf)
+        return region, distance
+
+    def line(self, x1, y1, x2, y2):
+        if self._stroke is None:
+            return
+        xy = self._transform([(x1, y1), (x2, y2)])
+        strokewidth = self._stroke_width()
+        grid = self._grid(xy, strokewidth)
+        if grid is None:
+            return
+        region, px, py = grid
+        (x0, y0), (x1, y1) = xy
+        distance = segment_distance(px, py, x0, y0, x1, y1)
+        self._blend(region, np.clip(strokewidth / 2 - distance + 0.5, 0, 1), self._stroke)
+
+    def _each(self, n, fills, strokes):
+        # The raster renderer has no batched primitives, so bulk calls loop with per-item styles
+        state = self._fill, self._stroke
+        fills = None if fills is None else to_plt_colors(fills, n)
+        strokes = None if strokes is None else to_plt_colors(strokes, n)
+        try:
+            for i in range(n):
+                if fills is not None:
+                    self._fill = tuple(fills[i])
+                if strokes is not None:
+                    self._stroke = tuple(strokes[i])
+                yield i
+        finally:
+            self._fill, self._stroke = state
+
+    def ellipses(self, xs, ys, ws, hs, fills=None, strokes=None):
+        xs, ys, ws, hs = np.broadcast_arrays(*[np.atleast_1d(v) for v in (xs, ys, ws, hs)])
+        for i in self._each(len(xs), fills, strokes):
+            self.ellipse(xs[i], ys[i], ws[i], hs[i])
+
+    def rects(self, xs, ys, ws, hs, fills=None, strokes=None):
+        xs, ys, ws, hs = np.broadcast_arrays(*[np.atleast_1d(v) for v in (xs, ys, ws, hs)])
+        for i in self._each(len(xs), fills, strokes):
+            self.rect(xs[i], ys[i], ws[i], hs[i])
+
+    def lines(self, x1s, y1s, x2s, y2s, strokes=None):
+        x1s, y1s, x2s, y2s = np.broadcast_arrays(*[np.atleast_1d(v) for v in (x1s, y1s, x2s, y2s)])
+        for i in self._each(len(x1s), None, strokes):
+            self.line(x1s[i], y1s[i], x2s[i], y2s[i])
+
+    def points(self, xs, ys, strokes=None):
+        xs, ys = np.broadcast_arrays(np.atleast_1d(xs), np.atleast_1d(ys))
+        state = self._fill, self._stroke
+        try:
+            self._fill, self._stroke = self._stroke, None
+            for i in self._each(len(xs), strokes, None):
+                if self._fill is not None:
+                    self.ellipse(xs[i], ys[i], self._strokeSize, self._strokeSize)
+        finally:
+            self._fill, self._stroke = state
+
+    def beginShape(self):
+        self._vertices.clear()
+
+    def vertex(self, x, y):
+        self._vertices.append(VERTEX, x, y)
+
+    def bezierVertex(self, x2, y2, x3, y3, x4, y4):
+        self._vertices.append(BEZIER, x2, y2, x3, y3, x4, y4)
+
+    def quadraticVertex(self, cx, cy, x3, y3):
+        self._vertices.append(QUADRATIC, cx, cy, x3, y3)
+
+    def curveVertex(self, x, y):
+        self._vertices.append(CURVE, x, y)
+
+    def beginContour(self):
+        self._vertices.append(CONTOUR, 0.0, 0.0)
+
+    def endContour(self):
+        pass
+
+    def curveTolerance(self, tolerance):
+        self._tolerance = tolerance
+
+    def endShape(self, mode=None):
+        contours = [c for c in get_path(self._vertices, self.matrix, self._tolerance) if len(c) >= 2]
+        if len(contours) == 0:
+            return
+        self._fill_contours(contours, closed=mode == self.CLOSE)
+
+    def size(self, width, height, mode=None):
+        if mode is None:
+            mode = self.P2D
+        assert mode != self.P3D, 'Not supported'
+        if self.ax is not None:
+            self.ax.set_xlim(0, width)
+            self.ax.set_ylim(0, height)
+            self.ax.set_aspect(1)
+        self.namespace['width'] = width
+        self.namespace['height'] = height
+        self._resize(width, height)
+
+    def pushMatrix(self):
+        self.matrix.push()
+
+    def popMatrix(self):
+        self.matrix.pop()
+
+    def translate(self, dx, dy):
+        self.matrix.translate(dx, dy)
+
+    def rotate(self, theta):
+        self.matrix.rotate(theta)
+
+    def scale(self, sx, sy=None):
+        self.matrix.scale(sx, sx if sy is None else sy)
+
+    def applyMatrix(self, n00, n01, n02, n10, n11, n12):
+        self.matrix.apply(np.array([[n00, n01, n02], [n10, n11, n12], [0, 0, 1]], dtype=float))
+
+    def resetMatrix(self):
+        self.matrix.reset()
+
+    def loadPixels(self):
+        rgba = self.to_rgba()
+        if self.pixels is None or self.pixels.shape != rgba.shape:
+            self.pixels = rgba
+        else:
+            self.pixels[...] = rgba
+        self.namespace['pixels'] = self.pixels
+
+    def updatePixels(self):
+        if self.pixels is None:
+            return
+        self._composite((slice(None), slice(None)), self.pixels)
+
+    def _composite(self, region, rgba):
+        rgba = rgba.astype(np.float32) / 255
+        target = self.buffer[region]
+        target += (rgba[:, :, :3] - target) * rgba[:, :, 3:]
+
+    def loadImage(self, path):
+        return load_image(path)
+
+    def image(self, img, x, y, w=None, h=None):
+        # Nearest neighbour sampling at the pixel centers of the target box
+        w = img.width if w is None else w
+        h = img.height if h is None else h
+        if not self.matrix.aligned:
+            self._warp_image(img, x, y, w, h)
+            return
+        (x0, y0), (x1, y1) = self._transform([(x, y), (x + w, y + h)]).tolist()
+        if x0 == x1 or y0 == y1:
+            return
+        bh, bw = self.buffer.shape[:2]
+        c0, c1 = sorted([x0, x1])
+        r0, r1 = sorted([y0, y1])
+        cols = np.arange(max(int(math.ceil(c0 - 0.5)), 0), min(int(math.ceil(c1 - 0.5)), bw))
+        rows = np.arange(max(int(math.ceil(r0 - 0.5)), 0), min(int(math.ceil(r1 - 0.5)), bh))
+        if len(cols) == 0 or len(rows) == 0:
+            return
+        sx = np.clip(((cols + 0.5 - x0) / (x1 - x0) * img.width).astype(int), 0, img.width - 1)
+        sy = np.clip(((rows + 0.5 - y0) / (y1 - y0) * img.height).astype(int), 0, img.height - 1)
+        self._composite((slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1)),
+                        img.pixels[sy[:, np.newaxis], sx])
+
+    def _warp_image(self, img, x, y, w, h):
+        # Pixel centers in the bounds of the transformed box are mapped back
+        # through the inverse transform and sampled where they hit the image
+        if w == 0 or h == 0:
+            return
+        corners = self._transform([(x, y), (x + w, y), (x + w, y + h), (x, y + h)])
+        bh, bw = self.buffer.shape[:2]
+        c0, r0 = np.maximum(np.ceil(corners.min(axis=0) - 0.5), 0).astype(int)
+        c1, r1 = np.ceil(corners.max(axis=0) - 0.5).astype(int)
+        c1, r1 = min(c1, bw), min(r1, bh)
+        if c0 >= c1 or r0 >= r1:
+            return
+        cols, rows = np.meshgrid(np.arange(c0, c1) + 0.5, np.arange(r0, r1) + 0.5)
+        inverse = np.linalg.inv(self.matrix.matrix)
+        u = inverse[0, 0] * cols + inverse[0, 1] * rows + inverse[0, 2]
+        v = inverse[1, 0] * cols + inverse[1, 1] * rows + inverse[1, 2]
+        sx = np.floor((u - x) / w * img.width).astype(int)
+        sy = np.floor((v - y) / h * img.height).astype(int)
+        inside = (sx >= 0) & (sx < img.width) & (sy >= 0) & (sy < img.height)
+        rgba = img.pixels[np.clip(sy, 0, img.height - 1), np.clip(sx, 0, img.width - 1)]
+        rgba = np.where(inside[:, :, np.newaxis], rgba, 0)
+        self._composite((slice(r0, r1), slice(c0, c1)), rgba)
+
+    def createFont(self, name, size=None, smooth=None, charset=None):
+        return PFont(name, size)
+
+    def textAlign(self, alignX, alignY=None):
+        halign = {self.LEFT: 'left', self.CENTER: 'center', self.RIGHT: 'right'}
+        valign = {self.TOP: 'top', self.CENTER: 'center', self.BOTTOM: 'bottom', self.BASELINE: 'baseline'}
+        self._textAlignX = halign[alignX]
+        self._textAlignY = 'baseline' if alignY is None else valign[alignY]
+
+    def textFont(self, which, size=None):
+        self._textFont = to_font(which)
+        if size is not None:
+            self._textSize = size
+
+    def textSize(self, size):
+        self._textSize = size
+
+    def textLeading(self, leading):
+        pass
+
+    def text(self, *args):
+        assert len(args) == 3
+        s, x, y = args
+        if self._fill is None:
+            return
+        name = None if self._textFont is None else self._textFont.name
+        size = self._textSize
+        if size is None and self._textFont is not None:
+            size = self._textFont.size
+        polygons, width, height = text_polygons(str(s), name, size)
+        if len(polygons) == 0:
+            return
+        dx = {'left': 0, 'center': -width / 2, 'right': -width}[self._textAlignX]
+        dy = {'baseline': 0, 'bottom': 0, 'center': height / 2, 'top': height}[self._textAlignY]
+        polygons = [self._transform(xy + (x + dx, y + dy)) for xy in polygons]
+        grid = self._grid(np.concatenate(polygons), 1)
+        if grid is None:
+            return
+        region, px, py = grid
+        rows, cols = region
+        inside = np.zeros(px.shape, dtype=bool)
+        distance = np.full(px.shape, np.inf, dtype=np.float32)
+        for xy in polygons:
+            # A closed outline changes neither the parity nor the edge
+            # distance of pixels away from its own bounds
+            window = self._bounds(*(xy.min(axis=0) - 1), *(xy.max(axis=0) + 1))
+            if window is None:
+                continue
+            sub = (slice(window[0].start - rows.start, window[0].stop - rows.start),
+                   slice(window[1].start - cols.start, window[1].stop - cols.start))
+            inside[sub] ^= polygon_inside(px[sub], py[sub], [xy], evenodd=True)
+            np.minimum(distance[sub], polyline_distance(px[sub], py[sub], xy, True),
+                       out=distance[sub])
+        coverage = np.clip(np.where(inside, distance, -distance) + 0.5, 0, 1)
+        self._blend(region, coverage, self._fill)
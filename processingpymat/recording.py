@@ -0,0 +1,421 @@
+import json
+import math
+from array import array
+from difflib import SequenceMatcher
+import numpy as np
+from .drawing import DrawingContextBase, PFont, load_image, to_font
+
+# Commands replayed by calling the backend with their numbers as arguments
+SCALAR_OPS = ['background', 'rect', 'ellipse', 'line', 'beginShape', 'vertex', 'endShape',
+              'bezierVertex', 'quadraticVertex', 'curveVertex', 'beginContour', 'endContour',
+              'curveTolerance', 'size', 'pushMatrix', 'popMatrix', 'translate', 'rotate', 'scale',
+              'applyMatrix', 'resetMatrix', 'textAlign', 'textSize', 'textLeading']
+# Bulk commands: the number of coordinate arrays and the optional color arrays
+BULK_OPS = {
+    'ellipses': (4, ['fills', 'strokes']),
+    'rects': (4, ['fills', 'strokes']),
+    'lines': (4, ['strokes']),
+    'points': (2, ['strokes']),
+}
+OPS = SCALAR_OPS + sorted(BULK_OPS.keys()) + ['textFont', 'text', 'updatePixels', 'image']
+OPCODES = dict([(name, i) for i, name in enumerate(OPS)])
+
+
+def _none_to_nan(value):
+    return math.nan if value is None else value
+
+def _nan_to_none(value):
+    return None if math.isnan(value) else value
+
+
+class DisplayList:
+    def __init__(self):
+        # Every command is an opcode, a style id and the range of its
+        # arguments in args
+        self.commands = array('q')
+        self.args = array('d')
+        self.styles = []
+        self.strings = []
+        # Snapshots of the pixels at each updatePixels()
+        self.arrays = []
+        self._style_ids = {}
+        self._string_ids = {}
+        # Backend state saved during the last replay, see replay()
+        self._checkpoint = None
+
+    def __len__(self):
+        return len(self.commands) // 4
+
+    def __eq__(self, other):
+        if not isinstance(other, DisplayList):
+            return False
+        return (self.commands.tobytes() == other.commands.tobytes() and
+                self.args.tobytes() == other.args.tobytes() and
+                self.styles == other.styles and self.strings == other.strings and
+                len(self.arrays) == len(other.arrays) and
+                all([np.array_equal(a, b) for a, b in zip(self.arrays, other.arrays)]))
+
+    __hash__ = None
+
+    def style_id(self, style):
+        if style not in self._style_ids:
+            self._style_ids[style] = len(self.styles)
+            self.styles.append(style)
+        return self._style_ids[style]
+
+    def string_id(self, s):
+        if s not in self._string_ids:
+            self._string_ids[s] = len(self.strings)
+            self.strings.append(s)
+        return self._string_ids[s]
+
+    def array_id(self, a):
+        self.arrays.append(np.array(a))
+        return len(self.arrays) - 1
+
+    def add(self, name, style, values):
+        self.commands.extend((OPCODES[name], style, len(self.args), len(values)))
+        self.args.extend(values)
+
+    def add_array(self, name, style, values):
+        self.commands.extend((OPCODES[name], style, len(self.args), len(values)))
+        self.args.frombytes(np.ascontiguousarray(values, dtype=float).tobytes())
+
+    def command(self, index):
+        op, style, start, count = self.commands[index * 4:index * 4 + 4]
+        return OPS[op], self.styles[style], self.args[start:start + count]
+
+    def _key(self, index):
+        # Commands are compared by their content, not by their ids
+        name, style, args = self.command(index)
+        if name in ('text', 'textFont', 'image'):
+            return name, style, args[1:].tobytes(), self.strings[int(args[0])]
+        if name == 'updatePixels':
+            return name, style, self.arrays[int(args[0])].tobytes()
+        return name, style, args.tobytes()
+
+    def common_prefix(self, other):
+        n = min(len(self), len(other))
+        for i in range(n):
+            if self._key(i) != other._key(i):
+                return i
+        return n
+
+    def diff(self, previous):
+        # Ranges of commands which differ from the previous display list,
+        # aligned so that an inserted or removed command only marks itself.
+        # Removed commands leave an empty range where they were.
+        matcher = SequenceMatcher(None, [previous._key(i) for i in range(len(previous))],
+                                  [self._key(i) for i in range(len(self))], autojunk=False)
+        return [(j1, j2) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+    def replay(self, backend, previous=None):
+        # With the display list last replayed into a backend which can
+        # snapshot its state, the commands shared with it are skipped by
+        # restoring the state saved at the end of the shared commands
+        first = 0
+        prefix = None
+        if previous is not None and hasattr(backend, 'snapshot'):
+            prefix = self.common_prefix(previous)
+            checkpoint = previous._checkpoint
+            previous._checkpoint = None
+            if checkpoint is not None and checkpoint[0] is backend and checkpoint[1] <= prefix:
+                backend.restore(checkpoint[2])
+                first = checkpoint[1]
+                if first == prefix:
+                    self._checkpoint = checkpoint
+        applied = None
+        for i in range(first, len(self)):
+            if i == prefix and i > 0 and self._checkpoint is None:
+                self._checkpoint = (backend, i, backend.snapshot())
+            op, style, start, count = self.commands[i * 4:i * 4 + 4]
+            if style != applied:
+                self._apply_style(backend, self.styles[style])
+                applied = style
+            name = OPS[op]
+            args = self.args[start:start + count]
+            if name in BULK_OPS:
+                self._replay_bulk(backend, name, args)
+            elif name == 'text':
+                backend.text(self.strings[int(args[0])], args[1], args[2])
+            elif name == 'textFont':
+                font = PFont(self.strings[int(args[0])], _nan_to_none(args[1]))
+                backend.textFont(font, _nan_to_none(args[2]))
+            elif name == 'updatePixels':
+                backend.loadPixels()
+                backend.pixels[...] = self.arrays[int(args[0])]
+                backend.updatePixels()
+            elif name == 'image':
+                backend.image(load_image(self.strings[int(args[0])]), args[1], args[2],
+                              _nan_to_none(args[3]), _nan_to_none(args[4]))
+            elif name == 'size':
+                # The sketch sees width and height as integers
+                backend.size(*[int(a) if a.is_integer() else a for a in args])
+            else:
+                getattr(backend, name)(*args)
+
+    def _apply_style(self, backend, style):
+        fill, stroke, strokeSize, antialiased = style
+        if fill is None:
+            backend.noFill()
+        else:
+            backend.fill(*fill)
+        if stroke is None:
+            backend.noStroke()
+        else:
+            backend.stroke(*stroke)
+        backend.strokeSize(strokeSize)
+        if antialiased:
+            backend.smooth()
+        else:
+            backend.noSmooth()
+
+    def _replay_bulk(self, backend, name, args):
+        count, colors = BULK_OPS[name]
+        values = np.frombuffer(args, dtype=float)
+        n = int(values[0])
+        widths = values[1:1 + len(colors)].astype(int)
+        offset = 1 + len(colors)
+        arrays = values[offset:offset + count * n].reshape(count, n)
+        offset += count * n
+        kwargs = {}
+        for key, width in zip(colors, widths):
+            if width == 0:
+                continue
+            c = values[offset:offset + n * width].reshape(n, width)
+            kwargs[key] = c[:, 0] if width == 1 else c
+            offset += n * width
+        getattr(backend, name)(*arrays, **kwargs)
+
+    def to_dict(self):
+        return {'commands': np.frombuffer(self.commands, dtype=np.int64).copy(),
+                'args': np.frombuffer(self.args, dtype=float).copy(),
+                'styles': self.styles, 'strings': self.strings, 'arrays': self.arrays}
+
+    @classmethod
+    def from_dict(cls, d):
+        display_list = cls()
+        display_list.commands.frombytes(np.asarray(d['commands'], dtype=np.int64).tobytes())
+        display_list.args.frombytes(np.asarray(d['args'], dtype=float).tobytes())
+        for fill, stroke, strokeSize, antialiased in d['styles']:
+            display_list.style_id((None if fill is None else tuple(fill),
+                                   None if stroke is None else tuple(stroke),
+                                   strokeSize, antialiased))
+        for s in d['strings']:
+            display_list.string_id(s)
+        display_list.arrays = list(d.get('arrays', []))
+        return display_list
+
+
+def save_display_lists(path, display_lists):
+    arrays = {}
+    meta = []
+    for i, display_list in enumerate(display_lists):
+        d = display_list.to_dict()
+        arrays['commands{}'.format(i)] = d['commands']
+        arrays['args{}'.format(i)] = d['args']
+        for j, a in enumerate(d['arrays']):
+            arrays['array{}_{}'.format(i, j)] = a
+        meta.append({'styles': d['styles'], 'strings': d['strings'], 'arrays': len(d['arrays'])})
+    np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+
+def load_display_lists(path):
+    with np.load(path) as f:
+        meta = json.loads(str(f['meta']))
+        return [DisplayList.from_dict({'commands': f['commands{}'.format(i)],
+                                       'args': f['args{}'.format(i)],
+                                       'styles': m['styles'], 'strings': m['strings'],
+                                       'arrays': [f['array{}_{}'.format(i, j)]
+                                                  for j in range(m.get('arrays', 0))]})
+                for i, m in enumerate(meta)]
+
+
+class RecordingContext(DrawingContextBase):
+    def __init__(self):
+        super().__init__()
+        self.display_list = DisplayList()
+        self._fill = (255.0,)
+        self._stroke = (0.0,)
+        self._strokeSize = 1.0
+        self._antialiased = True
+        self._style = None
+        self.pixels = None
+
+    def clear(self):
+        self.display_list = DisplayList()
+        self._style = None
+
+    def flush(self):
+        pass
+
+    def _current_style(self):
+        if self._style is None:
+            self._style = self.display_list.style_id((self._fill, self._stroke,
+                                                      self._strokeSize, self._antialiased))
+        return self._style
+
+    def _record(self, name, values):
+        self.display_list.add(name, self._current_style(), values)
+
+    def _record_bulk(self, name, arrays, colors):
+        arrays = np.broadcast_arrays(*[np.atleast_1d(np.asarray(a, dtype=float)) for a in arrays])
+        n = len(arrays[0])
+        packed = []
+        for c in colors:
+            if c is None:
+                packed.append(np.zeros((n, 0)))
+                continue
+            c = np.asarray(c, dtype=float)
+            packed.append(np.broadcast_to(c, (n,)).reshape(n, 1) if c.ndim <= 1
+                          else np.broadcast_to(c, (n, c.shape[-1])))
+        values = np.concatenate([[n], [c.shape[1] for c in packed]] +
+                                [a.ravel() for a in arrays] + [c.ravel() for c in packed])
+        self.display_list.add_array(name, self._current_style(), values)
+
+    def background(self, *args):
+        self._record('background', args)
+
+    def fill(self, *args):
+        self._fill = tuple([float(a) for a in args])
+        self._style = None
+
+    def stroke(self, *args):
+        self._stroke = tuple([float(a) for a in args])
+        self._style = None
+
+    def strokeSize(self, thickness):
+        self._strokeSize = float(thickness)
+        self._style = None
+
+    def noStroke(self):
+        self._stroke = None
+        self._style = None
+
+    def noFill(self):
+        self._fill = None
+        self._style = None
+
+    def smooth(self):
+        self._antialiased = True
+        self._style = None
+
+    def noSmooth(self):
+        self._antialiased = False
+        self._style = None
+
+    def rect(self, x, y, w, h):
+        self._record('rect', (x, y, w, h))
+
+    def ellipse(self, x, y, w, h):
+        self._record('ellipse', (x, y, w, h))
+
+    def line(self, x1, y1, x2, y2):
+        self._record('line', (x1, y1, x2, y2))
+
+    def ellipses(self, xs, ys, ws, hs, fills=None, strokes=None):
+        self._record_bulk('ellipses', (xs, ys, ws, hs), (fills, strokes))
+
+    def rects(self, xs, ys, ws, hs, fills=None, strokes=None):
+        self._record_bulk('rects', (xs, ys, ws, hs), (fills, strokes))
+
+    def lines(self, x1s, y1s, x2s, y2s, strokes=None):
+        self._record_bulk('lines', (x1s, y1s, x2s, y2s), (strokes,))
+
+    def points(self, xs, ys, strokes=None):
+        self._record_bulk('points', (xs, ys), (strokes,))
+
+    def beginShape(self):
+        self._record('beginShape', ())
+
+    def vertex(self, x, y):
+        self._record('vertex', (x, y))
+
+    def bezierVertex(self, x2, y2, x3, y3, x4, y4):
+        self._record('bezierVertex', (x2, y2, x3, y3, x4, y4))
+
+    def quadraticVertex(self, cx, cy, x3, y3):
+        self._record('quadraticVertex', (cx, cy, x3, y3))
+
+    def curveVertex(self, x, y):
+        self._record('curveVertex', (x, y))
+
+    def beginContour(self):
+        self._record('beginContour', ())
+
+    def endContour(self):
+        self._record('endContour', ())
+
+    def curveTolerance(self, tolerance):
+        self._record('curveTolerance', (tolerance,))
+
+    def endShape(self, mode=None):
+        self._record('endShape', () if mode is None else (mode,))
+
+    def size(self, width, height, mode=None):
+        self.namespace['width'] = width
+        self.namespace['height'] = height
+        self._record('size', (width, height) if mode is None else (width, height, mode))
+
+    def pushMatrix(self):
+        self._record('pushMatrix', ())
+
+    def popMatrix(self):
+        self._record('popMatrix', ())
+
+    def translate(self, dx, dy):
+        self._record('translate', (dx, dy))
+
+    def rotate(self, theta):
+        self._record('rotate', (theta,))
+
+    def scale(self, sx, sy=None):
+        self._record('scale', (sx,) if sy is None else (sx, sy))
+
+    def applyMatrix(self, n00, n01, n02, n10, n11, n12):
+        self._record('applyMatrix', (n00, n01, n02, n10, n11, n12))
+
+    def resetMatrix(self):
+        self._record('resetMatrix', ())
+
+    def loadPixels(self):
+        # The recorder has no canvas to read, so pixels keeps what the
+        # sketch last wrote into it
+        shape = (int(math.ceil(self.namespace['height'])), int(math.ceil(self.namespace['width'])), 4)
+        if self.pixels is None or self.pixels.shape != shape:
+            self.pixels = np.zeros(shape, dtype=np.uint8)
+        self.namespace['pixels'] = self.pixels
+
+    def updatePixels(self):
+        if self.pixels is None:
+            return
+        self._record('updatePixels', (self.display_list.array_id(self.pixels),))
+
+    def loadImage(self, path):
+        return load_image(path)
+
+    def image(self, img, x, y, w=None, h=None):
+        self._record('image', (self.display_list.string_id(img.path), x, y,
+                               _none_to_nan(w), _none_to_nan(h)))
+
+    def createFont(self, name, size=None, smooth=None, charset=None):
+        return PFont(name, size)
+
+    def textAlign(self, alignX, alignY=None):
+        self._record('textAlign', (alignX,) if alignY is None else (alignX, alignY))
+
+    def textFont(self, which, size=None):
+        which = to_font(which)
+        self._record('textFont', (self.display_list.string_id(which.name),
+                                  _none_to_nan(which.size), _none_to_nan(size)))
+
+    def textSize(self, size):
+        self._record('textSize', (size,))
+
+    def textLeading(self, leading):
+        self._record('textLeading', (leading,))
+
+    def text(self, *args):
+        if len(args) == 3:
+            self._record('text', (self.display_list.string_id(str(args[0])), args[1], args[2]))
+        else:
+            assert False
@@ -0,0 +1,121 @@
+import math
+import numpy as np
+from matplotlib.path import Path
+
+VERTEX = 0
+BEZIER = 1
+QUADRATIC = 2
+CURVE = 3
+CONTOUR = 4
+
+# Maximum distance of flattened curves from the exact ones, in sketch units
+TOLERANCE = 0.25
+MAX_SEGMENTS = 1000
+PATH_CACHE_SIZE = 256
+
+
+class VertexBuffer:
+    def __init__(self, capacity=64):
+        # One row per vertex call: its kind and up to three points
+        self._data = np.zeros((capacity, 7))
+        self.size = 0
+
+    def clear(self):
+        self.size = 0
+
+    def append(self, kind, x1, y1, x2=0.0, y2=0.0, x3=0.0, y3=0.0):
+        if self.size == len(self._data):
+            self._data = np.concatenate([self._data, np.zeros(self._data.shape)])
+        self._data[self.size] = (kind, x1, y1, x2, y2, x3, y3)
+        self.size += 1
+
+    @property
+    def rows(self):
+        return self._data[:self.size]
+
+    def key(self):
+        return self._data[:self.size].tobytes()
+
+
+def _segments(deviation, degree, tolerance):
+    # Wang's bound on the number of segments for the given tolerance
+    n = math.ceil(math.sqrt(degree * (degree - 1) / 8 * deviation / tolerance))
+    return min(max(n, 1), MAX_SEGMENTS)
+
+def cubic_points(p0, p1, p2, p3, tolerance=TOLERANCE):
+    p0, p1, p2, p3 = [np.asarray(p, dtype=float) for p in (p0, p1, p2, p3)]
+    deviation = max(np.hypot(*(p0 - 2 * p1 + p2)), np.hypot(*(p1 - 2 * p2 + p3)))
+    t = np.linspace(0, 1, _segments(deviation, 3, tolerance) + 1)[1:, np.newaxis]
+    mt = 1 - t
+    return mt ** 3 * p0 + 3 * mt ** 2 * t * p1 + 3 * mt * t ** 2 * p2 + t ** 3 * p3
+
+def quadratic_points(p0, p1, p2, tolerance=TOLERANCE):
+    p0, p1, p2 = [np.asarray(p, dtype=float) for p in (p0, p1, p2)]
+    t = np.linspace(0, 1, _segments(np.hypot(*(p0 - 2 * p1 + p2)), 2, tolerance) + 1)[1:, np.newaxis]
+    mt = 1 - t
+    return mt ** 2 * p0 + 2 * mt * t * p1 + t ** 2 * p2
+
+def flatten(rows, tolerance=TOLERANCE):
+    # Contours of line segments for the vertex calls of a shape. Points
+    # given with curveVertex() are joined by Catmull-Rom splines, which
+    # only start once four of them are known, like in Processing.
+    contours = []
+    points = []
+    curve = []
+    last = None
+    for kind, x1, y1, x2, y2, x3, y3 in rows.tolist():
+        if kind == CONTOUR:
+            contours.append(points)
+            points, curve, last = [], [], None
+            continue
+        if kind != CURVE:
+            curve = []
+        if kind == VERTEX:
+            new = [(x1, y1)]
+        elif kind == BEZIER:
+            new = cubic_points((x1, y1) if last is None else last, (x1, y1), (x2, y2), (x3, y3),
+                               tolerance)
+        elif kind == QUADRATIC:
+            new = quadratic_points((x1, y1) if last is None else last, (x1, y1), (x2, y2),
+                                   tolerance)
+        else:
+            curve.append((x1, y1))
+            if len(curve) < 4:
+                continue
+            p0, p1, p2, p3 = np.array(curve[-4:], dtype=float)
+            new = cubic_points(p1, p1 + (p2 - p0) / 6, p2 - (p3 - p1) / 6, p2, tolerance)
+            if len(curve) == 4:
+                new = np.concatenate([[p1], new])
+        new = np.asarray(new, dtype=float).reshape(-1, 2)
+        points.append(new)
+        last = new[-1]
+    contours.append(points)
+    return [np.concatenate(c) for c in contours if len(c) > 0]
+
+_paths = {}
+
+def get_path(vertices, matrix, tolerance=TOLERANCE):
+    # Flattened and transformed contours, cached by the content of the
+    # vertex buffer and the transform so that unchanged shapes are the same
+    # read-only arrays from frame to frame
+    key = (vertices.key(), matrix.affine, tolerance)
+    contours = _paths.get(key)
+    if contours is None:
+        contours = [matrix.transform(c) for c in flatten(vertices.rows, tolerance)]
+        for c in contours:
+            c.flags.writeable = False
+        if len(_paths) >= PATH_CACHE_SIZE:
+            _paths.clear()
+        contours = _paths[key] = contours
+    return contours
+
+def contour_path(contours, closed):
+    vertices = []
+    codes = []
+    for c in contours:
+        vertices.append(c)
+        codes += [Path.MOVETO] + [Path.LINETO] * (len(c) - 1)
+        if closed:
+            vertices.append(c[:1])
+            codes.append(Path.CLOSEPOLY)
+    return Path(np.concatenate(vertices), codes)
@@ -1,6 +1,12 @@
+import math
 from unittest.mock import Mock
+import numpy as np
+import matplotlib.collections as collections
+from matplotlib.artist import Artist
 import matplotlib.patches as patches
+from matplotlib.figure import Figure
 from processingpymat import drawing
+from processingpymat.processing import Processing
 
 def test_rect_buffer_with_stroke():
     axmock = Mock()
@@ -78,3 +84,439 @@ def test_3rects_buffer_without_stroke_2():
     assert axmock.add_patch.call_args_list[1].args[0].get_y() == 20
     assert axmock.add_patch.call_args_list[1].args[0].get_width() == 10
     assert axmock.add_patch.call_args_list[1].args[0].get_height() == 10
+
+def _create_axes():
+    fig = Figure()
+    ax = fig.add_subplot()
+    ax.set_xlim(0, 500)
+    ax.set_ylim(0, 500)
+    return ax
+
+def test_collection_runs_keep_draw_order():
+    ax = _create_axes()
+    cache = drawing.CollectionCache(ax)
+    cache.begin()
+    cache.add_rect(10, 20, 10, 10, {'linewidth': 1, 'facecolor': (1.0, 0.0, 0.0)})
+    cache.add_rect(40, 20, 10, 10, {'linewidth': 1, 'facecolor': (0.0, 1.0, 0.0)})
+    cache.add_ellipse(100, 100, 20, 30, {'linewidth': 0, 'facecolor': (0.0, 0.0, 1.0)})
+    cache.add_ellipse(200, 100, 20, 30, {'linewidth': 0, 'facecolor': (0.0, 0.0, 1.0)})
+    # The triangle covers an ellipse, so it is drawn after it
+    cache.add_polygon([[90, 90], [110, 90], [100, 110]], True, {'fill': False})
+    cache.flush()
+    assert [type(c) for c in ax.collections] == [collections.PolyCollection,
+                                                 collections.EllipseCollection,
+                                                 collections.PolyCollection]
+    assert len(ax.patches) == 0
+    assert len(ax.collections[0].get_paths()) == 2
+    assert ax.collections[0].get_facecolors()[1].tolist() == [0.0, 1.0, 0.0, 1.0]
+    assert ax.collections[1].get_offsets().tolist() == [[100, 100], [200, 100]]
+    assert ax.collections[2].get_facecolors()[0][3] == 0.0
+
+def test_collection_runs_merge_across_disjoint_shapes():
+    ax = _create_axes()
+    cache = drawing.CollectionCache(ax)
+    cache.begin()
+    for i in range(10):
+        x = 20 + i * 40
+        cache.add_polygon([[x - 10, 10], [x + 10, 10], [x, 30]], True, {'facecolor': (1.0, 0.0, 0.0)})
+        cache.add_ellipse(x, 20, 6, 6, {'facecolor': (0.0, 0.0, 1.0)})
+    cache.flush()
+    assert [type(c) for c in ax.collections] == [collections.PolyCollection,
+                                                 collections.EllipseCollection]
+    assert len(ax.collections[0].get_paths()) == 10
+
+def test_collection_reuse_updates_changed_runs_only():
+    ax = _create_axes()
+    cache = drawing.CollectionCache(ax)
+    updates = []
+    for x in [100, 100, 150]:
+        cache.begin()
+        cache.clear()
+        cache.add_rect(10, 20, 10, 10, {'linewidth': 0, 'facecolor': (1.0, 0.0, 0.0)})
+        cache.add_ellipse(x, 100, 20, 30, {'linewidth': 0, 'facecolor': (0.0, 0.0, 1.0)})
+        cache.flush()
+        updates.append(cache.updates)
+    assert len(ax.collections) == 2
+    assert len(updates[0]) == 2
+    assert len(updates[1]) == 0
+    assert updates[2] == [ax.collections[1]]
+    assert ax.collections[1].get_offsets().tolist() == [[150, 100]]
+
+def test_patch_pool_reuses_artists_across_order_and_size_changes():
+    ax = _create_axes()
+    cache = drawing.PatchCache(ax)
+    cache.begin()
+    cache.clear()
+    cache.add_rect(10, 20, 10, 10, {'linewidth': 1})
+    cache.add_ellipse(100, 100, 20, 30, {'linewidth': 1})
+    cache.add_polygon([[0, 0], [10, 0], [5, 5]], True, {'linewidth': 1})
+    cache.flush()
+    rect, ellipse, polygon = ax.patches
+
+    cache.begin()
+    cache.clear()
+    cache.add_ellipse(100, 100, 40, 50, {'linewidth': 1})
+    cache.add_rect(10, 20, 10, 10, {'linewidth': 1})
+    cache.add_polygon([[0, 0], [10, 0], [5, 5]], True, {'linewidth': 1})
+    cache.add_ellipse(200, 100, 20, 30, {'linewidth': 1})
+    cache.flush()
+    assert len(ax.patches) == 4
+    assert [p for _, p in cache.patches][:3] == [ellipse, rect, polygon]
+    assert ellipse.get_width() == 40
+    assert ellipse.get_height() == 50
+    assert ellipse.get_zorder() < rect.get_zorder() < polygon.get_zorder()
+
+    cache.begin()
+    cache.clear()
+    cache.add_rect(10, 20, 10, 10, {'linewidth': 1})
+    cache.flush()
+    assert ax.patches[:] == [rect]
+
+def test_lines_are_pooled_and_reported():
+    ax = _create_axes()
+    cache = drawing.PatchCache(ax)
+    updates = []
+    for x in [100, 100, 150]:
+        cache.begin()
+        cache.clear()
+        cache.add_line(0, 0, x, 100, {'linewidth': 1, 'color': (0.0, 0.0, 0.0)})
+        cache.add_rect(10, 20, 10, 10, {'linewidth': 1})
+        cache.flush()
+        updates.append(cache.updates)
+    assert len(ax.lines) == 1
+    line = ax.lines[0]
+    assert updates[0] == [line, ax.patches[0]]
+    assert updates[1] == []
+    assert updates[2] == [line]
+    assert list(line.get_xdata()) == [0, 150]
+    assert line.get_zorder() < ax.patches[0].get_zorder()
+
+def test_collection_lines():
+    ax = _create_axes()
+    cache = drawing.CollectionCache(ax)
+    cache.begin()
+    cache.add_line(0, 0, 100, 100, {'linewidth': 1, 'color': (1.0, 0.0, 0.0)})
+    cache.add_line(0, 100, 100, 0, {'linewidth': 2, 'color': (0.0, 0.0, 1.0)})
+    cache.flush()
+    assert len(ax.lines) == 0
+    assert len(ax.collections) == 1
+    assert type(ax.collections[0]) == collections.LineCollection
+    assert list(ax.collections[0].get_linewidths()) == [1, 2]
+
+def test_texts_are_reused_by_draw_position():
+    ax = _create_axes()
+    cache = drawing.PatchCache(ax)
+    font = drawing.get_font_properties(None, 12)
+    updates = []
+    for score in [1, 1, 2]:
+        cache.begin()
+        cache.clear()
+        cache.add_text(10, 10, 'score', {'fontproperties': font})
+        cache.add_text(10, 30, str(score), {'fontproperties': font})
+        cache.flush()
+        updates.append(cache.updates)
+    assert len(ax.texts) == 2
+    assert updates[1] == []
+    assert updates[2] == [ax.texts[1]]
+    assert ax.texts[1].get_text() == '2'
+    assert drawing.get_font_properties(None, 12) is font
+
+def test_text_font_by_name():
+    sketch = '''
+def draw():
+    background(255)
+    fill(0)
+    textFont('serif', 14)
+    text('a', 10, 20)
+    textFont(createFont('monospace', 10))
+    text('b', 10, 40)
+'''
+    for renderer in ['patch', 'raster']:
+        for recording in [False, True]:
+            process = Processing(sketch, {}, recording=recording)
+            frame = next(process._render_frames(0, 1, 0, (50, 50), renderer, 100))
+            assert frame[:, :, 0].min() < 128
+
+def test_line_caps_match_across_renderers():
+    sketch = '''
+def draw():
+    background(255)
+    strokeSize(6)
+    line(20, 50, 80, 50)
+    lines([20], [70], [80], [70])
+'''
+    for renderer in ['patch', 'collection', 'raster']:
+        frame = next(Processing(sketch, {})._render_frames(0, 1, 0, (100, 100), renderer, 100))
+        for y in [50, 70]:
+            covered = np.nonzero(frame[y, :, 0] < 128)[0]
+            # Round caps reach half the stroke size beyond the end points
+            assert abs(covered[0] - 17) <= 1 and abs(covered[-1] - 82) <= 1, renderer
+
+def test_matrix_stack_composition():
+    m = drawing.MatrixStack()
+    m.translate(10, 20)
+    m.push()
+    m.rotate(math.pi / 2)
+    m.scale(2, 3)
+    x, y = m.transform_point(1, 1)
+    assert abs(x - 7) < 1e-9
+    assert abs(y - 22) < 1e-9
+    assert m.transform([(1, 1)]).tolist() == [[x, y]]
+    assert not m.aligned
+    m.pop()
+    assert m.transform_point(1, 1) == (11, 21)
+    assert m.aligned
+
+def test_shapes_are_transformed_before_the_cache():
+    ax = _create_axes()
+    ctx = drawing.DrawingContext(None, ax, (500, 500))
+    ctx.clear()
+    ctx.noStroke()
+    ctx.translate(100, 50)
+    ctx.scale(2)
+    ctx.rect(0, 0, 10, 5)
+    ctx.rotate(math.pi / 2)
+    ctx.rect(0, 0, 10, 5)
+    ctx.ellipse(0, 0, 10, 4)
+    ctx.flush()
+    rect, polygon, ellipse = ax.patches
+    assert (rect.get_x(), rect.get_y(), rect.get_width(), rect.get_height()) == (100, 50, 20, 10)
+    assert np.allclose(polygon.get_xy()[:4], [(100, 50), (100, 70), (90, 70), (90, 50)])
+    assert np.allclose((ellipse.get_width(), ellipse.get_height(), abs(ellipse.get_angle())), (20, 8, 90))
+    assert all([Artist.get_transform(p) is ax.transData for p in ax.patches])
+
+def test_bulk_colors_accept_one_rgb_color():
+    assert np.allclose(drawing.to_plt_colors((255, 0, 0), 5), [(1, 0, 0, 1)] * 5)
+    assert np.allclose(drawing.to_plt_colors((255, 0, 0), 3), [(1, 0, 0, 1)] * 3)
+    assert np.allclose(drawing.to_plt_colors([0, 0, 255, 51], 2), [(0, 0, 1, 0.2)] * 2)
+    # Per-item grays are a list or an array with one value per item
+    assert np.allclose(drawing.to_plt_colors([0, 255, 0], 3)[:, 0], [0, 1, 0])
+    ax = _create_axes()
+    ctx = drawing.DrawingContext(None, ax, (500, 500), batched=True)
+    ctx.ellipses(np.arange(8), np.arange(8), 8, 8, fills=(255, 0, 0))
+    ctx.flush()
+    assert np.allclose(ax.collections[0].get_facecolors(), (1, 0, 0, 1))
+
+def _draw_bulk(ctx):
+    ctx.clear()
+    ctx.background(255)
+    ctx.strokeSize(1)
+    ctx.rect(0, 0, 10, 10)
+    ctx.ellipses(np.arange(100), np.arange(100), 5, 5, fills=np.arange(100))
+    ctx.strokeSize(3)
+    ctx.points([1, 2, 3], [4, 5, 6], strokes=[(255, 0, 0), (0, 255, 0), (0, 0, 255)])
+    ctx.rect(20, 20, 10, 10)
+    ctx.flush()
+
+def test_bulk_calls_create_one_collection_in_draw_order():
+    ax = _create_axes()
+    ctx = drawing.DrawingContext(None, ax, (500, 500))
+    _draw_bulk(ctx)
+    _, first, second = ax.patches
+    ellipses, points = ax.collections
+    assert len(ellipses.get_offsets()) == 100
+    assert np.allclose(ellipses.get_facecolors()[10], (10 / 255, 10 / 255, 10 / 255, 1))
+    assert np.allclose(points.get_facecolors()[:, :3], np.eye(3))
+    assert np.allclose(points.get_widths(), 3)
+    assert first.get_zorder() < ellipses.get_zorder() < points.get_zorder() < second.get_zorder()
+
+    _draw_bulk(ctx)
+    assert list(ax.collections) == [ellipses, points]
+    assert ellipses not in ctx.updates
+    assert points not in ctx.updates
+
+def test_batched_bulk_calls_join_runs():
+    ax = _create_axes()
+    ctx = drawing.DrawingContext(None, ax, (500, 500), batched=True)
+    _draw_bulk(ctx)
+    first, ellipses, second = sorted(ax.collections, key=lambda c: c.get_zorder())
+    assert isinstance(ellipses, collections.EllipseCollection)
+    assert len(ellipses.get_offsets()) == 103
+    assert np.allclose(ellipses.get_facecolors()[100:, :3], np.eye(3))
+
+def _draw_static(ctx, color=0):
+    ctx.clear()
+    ctx.background(255)
+    ctx.fill(color)
+    ctx.rect(10, 10, 20, 20)
+    ctx.ellipse(50, 50, 10, 10)
+    ctx.beginShape()
+    ctx.vertex(0, 0)
+    ctx.vertex(10, 0)
+    ctx.vertex(5, 5)
+    ctx.endShape(ctx.CLOSE)
+    ctx.line(0, 0, 100, 100)
+    ctx.text('static', 10, 100)
+    ctx.flush()
+
+def test_unchanged_artists_are_not_updated():
+    for batched in (False, True):
+        ax = _create_axes()
+        ctx = drawing.DrawingContext(None, ax, (500, 500), batched=batched)
+        _draw_static(ctx)
+        assert len(ctx.updates) == len(ctx.artists)
+        _draw_static(ctx)
+        assert ctx.updates == []
+        assert not ctx.changed
+        _draw_static(ctx, color=128)
+        assert 0 < len(ctx.updates) < len(ctx.artists)
+        if not batched:
+            assert ctx.artists[0] not in ctx.updates
+
+def test_styles_are_interned():
+    ctx = drawing.DrawingContext(None, _create_axes(), (500, 500))
+    ctx.fill(255, 0, 0)
+    style = ctx._to_patch_args()
+    assert ctx._to_patch_args() is style
+    ctx.stroke(255)
+    assert ctx._to_patch_args() is not style
+    ctx.stroke(0, 0, 0)
+    assert ctx._to_patch_args() is style
+    assert style['facecolor'] == (1.0, 0.0, 0.0)
+    assert style.row[0] == (1.0, 0.0, 0.0, 1.0)
+    assert drawing.get_style(**dict(style)) is style
+    try:
+        style['facecolor'] = (0.0, 0.0, 0.0)
+        assert False
+    except TypeError:
+        pass
+
+def test_rects_are_coalesced_into_a_cover():
+    ax = _create_axes()
+    cache = drawing.PatchCache(ax)
+    cache.begin()
+    cache.add_rect(0, 0, 10, 10, {'facecolor': (1.0, 0.0, 0.0)})
+    for y in range(3):
+        for x in range(4):
+            cache.add_rect(100 + x * 10, y * 10, 10, 10, {'facecolor': (1.0, 1.0, 1.0)})
+    cache.add_rect(100, 30, 10, 10, {'facecolor': (1.0, 1.0, 1.0)})
+    cache.add_ellipse(0, 0, 10, 10, {'facecolor': (1.0, 1.0, 1.0)})
+    cache.add_rect(0, 50, 10, 10, {'facecolor': (1.0, 1.0, 1.0, 0.5)})
+    cache.add_rect(5, 50, 10, 10, {'facecolor': (1.0, 1.0, 1.0, 0.5)})
+    cache.flush()
+    rects = [(p.get_x(), p.get_y(), p.get_width(), p.get_height())
+             for _, p in cache.patches if isinstance(p, patches.Rectangle)]
+    assert rects == [(0, 0, 10, 10), (100, 0, 10, 40), (110, 0, 30, 30),
+                     (0, 50, 10, 10), (5, 50, 10, 10)]
+    assert cache.counters.merges == 11
+    assert isinstance(cache.patches[3][1], patches.Ellipse)
+
+def test_uniform_grids_become_an_image():
+    for batched in (False, True):
+        ax = _create_axes()
+        ctx = drawing.DrawingContext(None, ax, (500, 500), batched=batched)
+        ctx.clear()
+        ctx.background(255)
+        ctx.noStroke()
+        ctx.fill(0)
+        for y in range(10):
+            for x in range(10):
+                if (x + y) % 2 == 0:
+                    ctx.rect(x * 10, y * 10, 10, 10)
+        ctx.rect(200, 200, 10, 10)
+        ctx.ellipse(0, 0, 10, 10)
+        ctx.flush()
+        image = ax.images[0]
+        assert tuple(image.get_extent()) == (0, 210, 210, 0)
+        assert image.get_array()[:2, :2, 3].tolist() == [[255, 0], [0, 255]]
+        assert image.get_array()[20, 20, 3] == 255
+        assert ctx.artists.index(image) == 1
+        assert len(ctx.artists) == 3
+
+def test_image_data_is_shared_through_private_attributes():
+    # Fails when matplotlib drops the attributes that sharing pixels relies on
+    import matplotlib.image as mimage
+    image = mimage.AxesImage(_create_axes())
+    assert hasattr(image, '_A') and hasattr(image, '_imcache')
+    rgba = np.zeros((4, 6, 4), dtype=np.uint8)
+    drawing.share_image_data(image, rgba)
+    assert image.get_array() is rgba
+    del image._imcache
+    drawing.share_image_data(image, rgba + 1)
+    assert image.get_array() is not rgba and image.get_array()[0, 0, 0] == 1
+
+def test_pixels_are_shared_with_one_image(tmp_path):
+    import matplotlib.image as mimage
+    for batched in (False, True):
+        ax = _create_axes()
+        ctx = drawing.DrawingContext(None, ax, (20, 10), batched=batched)
+        images = []
+        for frame in range(3):
+            ctx.clear()
+            ctx.background(255)
+            ctx.loadPixels()
+            ctx.pixels[:, frame] = (255, 0, 0, 255)
+            ctx.updatePixels()
+            ctx.flush()
+            images.append(ax.images[0])
+            assert ctx.namespace['pixels'] is ctx.pixels
+            assert ax.images[0].get_array() is ctx.pixels
+            assert ax.images[0] in ctx.updates
+        assert len(ax.images) == 1 and images[0] is images[2]
+        assert tuple(ax.images[0].get_extent()) == (0, 20, 10, 0)
+
+    path = str(tmp_path / 'image.png')
+    mimage.imsave(path, np.zeros((4, 6, 3)))
+    img = drawing.load_image(path)
+    assert (img.width, img.height) == (6, 4)
+    assert img.pixels[0, 0].tolist() == [0, 0, 0, 255]
+    assert drawing.load_image(path) is img
+    ctx = drawing.DrawingContext(None, _create_axes(), (20, 10))
+    ctx.clear()
+    ctx.translate(5, 2)
+    ctx.image(img, 0, 0, 12, 8)
+    ctx.flush()
+    assert ctx.artists[0].get_array() is img.pixels
+    assert tuple(ctx.artists[0].get_extent()) == (5, 17, 10, 2)
+
+def _draw_outline(ctx, dx=0):
+    ctx.clear()
+    ctx.background(255)
+    ctx.translate(dx, 0)
+    ctx.beginShape()
+    ctx.vertex(10, 10)
+    ctx.bezierVertex(40, 0, 60, 50, 90, 10)
+    ctx.quadraticVertex(90, 90, 10, 90)
+    ctx.beginContour()
+    ctx.vertex(30, 30)
+    ctx.vertex(30, 60)
+    ctx.vertex(60, 60)
+    ctx.endContour()
+    ctx.endShape(ctx.CLOSE)
+    ctx.flush()
+
+def test_curves_are_flattened_within_tolerance():
+    from processingpymat import shapes
+    from processingpymat.raster import polyline_distance
+    points = shapes.cubic_points((0, 0), (0, 100), (100, 100), (100, 0), 0.1)
+    t = np.linspace(0, 1, 1001)[:, np.newaxis]
+    exact = 3 * (1 - t) ** 2 * t * [0, 100] + 3 * (1 - t) * t ** 2 * [100, 100] + t ** 3 * [100, 0]
+    polyline = np.concatenate([[(0, 0)], points])
+    assert 10 < len(points) < 100
+    assert tuple(points[-1]) == (100, 0)
+    assert polyline_distance(exact[:, 0], exact[:, 1], polyline, False).max() <= 0.1
+
+    vertices = shapes.VertexBuffer(capacity=2)
+    for x, y in [(0, 0), (10, 0), (20, 10), (30, 0), (40, 0)]:
+        vertices.append(shapes.CURVE, x, y)
+    contours = shapes.flatten(vertices.rows)
+    assert len(contours) == 1
+    assert tuple(contours[0][0]) == (10, 0) and tuple(contours[0][-1]) == (30, 0)
+
+def test_unchanged_paths_are_cached():
+    for batched in (False, True):
+        ax = _create_axes()
+        ctx = drawing.DrawingContext(None, ax, (100, 100), batched=batched)
+        _draw_outline(ctx)
+        shape = ctx.artists[1]
+        assert isinstance(shape, patches.PathPatch)
+        codes = shape.get_path().codes
+        assert (codes == patches.Path.MOVETO).sum() == 2
+        assert (codes == patches.Path.CLOSEPOLY).sum() == 2
+        path = shape.get_path()
+        _draw_outline(ctx)
+        assert ctx.updates == []
+        assert ctx.artists[1].get_path() is path
+        _draw_outline(ctx, dx=5)
+        assert ctx.updates == [shape]
+        assert shape.get_path().vertices[0].tolist() == [15, 10]
@@ -0,0 +1,67 @@
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from processingpymat.events import EventQueue
+from processingpymat.processing import Processing
+
+def test_motion_is_coalesced_and_queue_is_bounded():
+    events = EventQueue(maxlen=3)
+    for x in range(10):
+        events.post('mouseMoved', x, x * 2)
+    assert len(events) == 1
+    assert events.coalesced == 9
+    events.post('mousePressed', 9, 18, button=1)
+    events.post('mouseDragged', 10, 20, button=1)
+    events.post('mouseDragged', 11, 22, button=1)
+    events.post('keyPressed', key='a')
+    assert len(events) == 3
+    ctx = {'mouseX': 0, 'mouseY': 0, 'mousePressed': False, 'moved': [],
+           'mouseDragged': lambda: ctx['moved'].append((ctx['mouseX'], ctx['mouseY']))}
+    events.dispatch(ctx)
+    assert events.counts() == (3, 1)
+    assert ctx['moved'] == [(11, 22)]
+    assert (ctx['pmouseX'], ctx['pmouseY']) == (0, 0)
+    assert ctx['mousePressed'] and ctx['key'] == 'a' and ctx['mouseButton'] == 1
+    events.dispatch(ctx)
+    assert (ctx['pmouseX'], ctx['pmouseY']) == (11, 22)
+    assert events.counts() == (0, 0)
+
+MOUSE_SKETCH = '''
+def mouseMoved():
+    calls.append(('moved', frameCount, mouseX, mouseY, pmouseX, pmouseY))
+
+def mousePressed():
+    calls.append(('pressed', frameCount, isMousePressed))
+
+def draw():
+    calls.append(('draw', frameCount))
+'''
+
+def test_events_are_dispatched_before_draw():
+    from matplotlib.backend_bases import MouseEvent
+    calls = []
+    fig = plt.figure()
+    try:
+        process = Processing(MOUSE_SKETCH, {'calls': calls})
+        anim = process.plot(fig, fig.gca(), realtime=False)
+        fig.canvas.draw()
+        anim._draw_next_frame(0, True)
+        start = len(calls)
+        ax = fig.gca()
+        for x, y in [(10, 20), (30, 40), (50, 60)]:
+            px, py = ax.transData.transform((x, y))
+            fig.canvas.callbacks.process('motion_notify_event',
+                                         MouseEvent('motion_notify_event', fig.canvas, px, py))
+        px, py = ax.transData.transform((50, 60))
+        fig.canvas.callbacks.process('button_press_event',
+                                     MouseEvent('button_press_event', fig.canvas, px, py, 1))
+        anim._draw_next_frame(1, True)
+    finally:
+        plt.close(fig)
+    # The motion is delivered once, at its latest position, before draw()
+    frame = calls[start - 1][1]
+    moved, pressed, draw = calls[start:]
+    assert moved[:2] == ('moved', frame)
+    assert abs(moved[2] - 50) < 1e-6 and abs(moved[3] - 60) < 1e-6
+    assert (pressed, draw) == (('pressed', frame, True), ('draw', frame + 1))
+    assert process.metrics.records[-1]['events'] == 2
@@ -0,0 +1,38 @@
+import csv
+from processingpymat import metrics
+from processingpymat.processing import Processing
+
+SKETCH = '''
+def draw():
+    background(255)
+    for i in range(5):
+        rect(i * 20, 0, 10, 10)
+    ellipse(50, 50, 10, 10)
+'''
+
+def test_ring_buffer_is_bounded(tmp_path):
+    frames = metrics.FrameMetrics(size=3)
+    for i in range(5):
+        frames.add(i, draw=0.1)
+    frames.set_render(0.2, blitted=4)
+    assert len(frames) == 3
+    assert [r['frame'] for r in frames] == [2, 3, 4]
+    assert frames[-1]['render'] == 0.2
+    assert frames[-1]['blitted'] == 4
+    path = str(tmp_path / 'metrics.csv')
+    frames.to_csv(path)
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 3
+    assert rows[0]['frame'] == '2'
+
+def test_export_records_cache_counters(tmp_path):
+    process = Processing(SKETCH, {})
+    process.export(str(tmp_path / 'frames'), frames=3, figsize=(100, 100))
+    records = list(process.metrics)
+    assert [r['frame'] for r in records] == [0, 1, 2]
+    assert records[0]['created'] == 7
+    assert records[1]['created'] == 0
+    assert records[1]['reused'] == 7
+    assert records[1]['removed'] == 0
+    assert all([r['render'] > 0 for r in records])
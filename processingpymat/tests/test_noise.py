@@ -0,0 +1,44 @@
+import numpy as np
+from processingpymat.noise import Noise, RandomSource
+from processingpymat.processing import Processing
+
+def test_vectorized_noise_matches_scalar_noise():
+    noise = Noise(1)
+    xs = np.linspace(-3, 5, 50)
+    ys = np.linspace(2, 7, 50)
+    values = noise.noise(xs, ys, 0.3)
+    assert values.shape == (50,)
+    assert np.allclose(values, [noise.noise(x, y, 0.3) for x, y in zip(xs, ys)])
+    assert values.min() >= 0 and values.max() <= 1
+    grid = noise.noise(*np.mgrid[0:4, 0:3] * 0.1)
+    assert grid.shape == (4, 3)
+
+def test_noise_seed_and_detail():
+    a, b = Noise(3), Noise(3)
+    assert a.noise(0.3, 1.7) == b.noise(0.3, 1.7)
+    assert Noise(4).noise(0.3, 1.7) != a.noise(0.3, 1.7)
+    b.detail(1)
+    assert b.noise(0.3, 1.7) != a.noise(0.3, 1.7)
+
+def test_buffered_random_is_seeded():
+    source = RandomSource(block=4)
+    source.seed(7)
+    values = [source.random(10, 20) for i in range(10)]
+    source.seed(7)
+    assert values == [source.random(10, 20) for i in range(10)]
+    assert all(10 <= v < 20 for v in values)
+
+def test_noise_in_sketch():
+    sketch = '''
+def setup():
+    noiseSeed(1)
+    randomSeed(2)
+    values.append(noise(0.3))
+    values.append(random())
+'''
+    results = []
+    for i in range(2):
+        values = []
+        list(Processing(sketch, {'values': values})._render_frames(0, 1, 0, (20, 20), 'raster', 100))
+        results.append(values)
+    assert results[0] == results[1]
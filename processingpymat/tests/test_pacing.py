@@ -0,0 +1,75 @@
+import os
+from processingpymat.pacing import Pacer
+from processingpymat.processing import Processing
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_pacer_drops_frames_when_behind():
+    clock = FakeClock()
+    pacer = Pacer(10, maxskip=3, clock=clock)
+    pacer.tick()
+    pacer.rebase()
+    clock.now = 0.1
+    assert pacer.behind() == 0
+    pacer.tick()
+    clock.now = 0.45
+    assert pacer.behind() == 2
+    for i in range(3):
+        pacer.tick()
+    clock.now = 2.0
+    # Lag beyond maxskip is dropped instead of accumulated
+    assert pacer.behind() == 3
+    for i in range(4):
+        pacer.tick()
+    clock.now = 2.1
+    assert pacer.behind() == 0
+
+
+def test_pacer_measures_fps_and_framerate_changes():
+    clock = FakeClock()
+    pacer = Pacer(60, clock=clock)
+    for i in range(5):
+        pacer.tick()
+        pacer.rendered()
+        clock.now += 0.05
+    assert abs(pacer.fps - 20) < 1e-9
+    assert pacer.millis() == 250
+    pacer.frameRate(20)
+    assert pacer.interval() == 50
+    assert pacer.interval(skipframes=1) == 100
+    clock.now += 0.05
+    assert pacer.behind() == 0
+
+
+def test_offline_pacer_follows_frame_clock():
+    pacer = Pacer(25, realtime=False)
+    for i in range(3):
+        pacer.tick()
+    assert pacer.millis() == 80
+    assert pacer.behind() == 0
+
+
+SKETCH = '''
+def setup():
+    size(20, 20)
+    frameRate(25)
+
+def draw():
+    counts.append((frameCount, millis()))
+    background(0)
+'''
+
+def test_sketch_sees_frame_count_and_millis(tmp_path):
+    counts = []
+    process = Processing(SKETCH, {'counts': counts})
+    process.export(str(tmp_path / 'frames'), frames=3, skipframes=1, renderer='raster')
+    assert len(os.listdir(str(tmp_path / 'frames'))) == 3
+    assert counts == [(1, 0), (2, 40), (3, 80), (4, 120), (5, 160)]
+    assert process.pacer.framerate == 25
@@ -0,0 +1,243 @@
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+from processingpymat.processing import Processing
+
+SKETCH = '''
+def draw():
+    background(255)
+    rect(10, 10, 20, 20)
+    if frameCount > 5:
+        ellipse(50, 50, 10, 10)
+'''
+
+def test_unchanged_frames_skip_drawing():
+    fig = plt.figure()
+    try:
+        process = Processing(SKETCH, {})
+        anim = process.plot(fig, fig.gca(), realtime=False)
+        fig.canvas.draw()
+        for frame in range(5):
+            anim._draw_next_frame(frame, True)
+        blitted = [r['blitted'] for r in process.metrics][-5:]
+        # The first frame fills the background cache, and afterwards only
+        # the frame adding the ellipse is drawn
+        assert blitted == [2, 0, 0, 3, 0]
+    finally:
+        plt.close(fig)
+
+BACKDROP_SKETCH = '''
+def draw():
+    background(255)
+    for i in range(10):
+        fill(0 if i == 2 and frameCount >= 12 else 255)
+        rect(i * 40, 0, 20, 500)
+    ellipse(frameCount * 10, 100, 30, 30)
+'''
+
+def test_static_artists_are_promoted_into_the_background():
+    fig = plt.figure()
+    try:
+        process = Processing(BACKDROP_SKETCH, {})
+        anim = process.plot(fig, fig.gca(), realtime=False, static_after=3)
+        fig.canvas.draw()
+        for frame in range(14):
+            anim._draw_next_frame(frame, True)
+        records = list(process.metrics)[-14:]
+        assert records[0]['blitted'] == 12
+        assert records[6]['static'] == 11
+        assert records[6]['blitted'] == 1
+        # A change in the backdrop sends it back to the live layer
+        assert [r['static'] for r in records if r['frame'] in (9, 10)] == [3, 3]
+        assert [r['blitted'] for r in records if r['frame'] in (9, 10)] == [9, 9]
+
+        blitted = np.asarray(fig.canvas.buffer_rgba()).copy()
+        for a in anim._context.artists:
+            a.set_animated(False)
+        fig.canvas.draw()
+        assert np.array_equal(blitted, np.asarray(fig.canvas.buffer_rgba()))
+    finally:
+        plt.close(fig)
+
+EDGE_SKETCH = '''
+def draw():
+    background(255)
+    fill(200)
+    rect(0, 0, 500, 500)
+    fill(0, 0, 255)
+    ellipses([495, 5, 250], [(frameCount * 37) % 500, 250, 495], 30, 30)
+'''
+
+def test_layer_matches_full_redraw_at_axes_edge():
+    # The axes end inside a pixel column, which shapes at the edge only
+    # partly cover
+    for renderer in ['patch', 'collection']:
+        fig = plt.figure()
+        try:
+            process = Processing(EDGE_SKETCH, {})
+            anim = process.plot(fig, fig.gca(), realtime=False, static_after=2,
+                                renderer=renderer)
+            fig.canvas.draw()
+            for frame in range(12):
+                anim._draw_next_frame(frame, True)
+            assert process.metrics[-1]['static'] > 0
+            blitted = np.asarray(fig.canvas.buffer_rgba()).copy()
+            for a in anim._context.artists:
+                a.set_animated(False)
+            fig.canvas.draw()
+            assert np.array_equal(blitted, np.asarray(fig.canvas.buffer_rgba())), renderer
+        finally:
+            plt.close(fig)
+
+def test_api_is_bound_in_sketch_globals(tmp_path):
+    import builtins
+    from processingpymat import processing
+    calls = []
+    sketch = '''
+def draw():
+    calls.append((frameCount, type(rect.__self__).__name__))
+    rect(0, 0, 10, 10)
+'''
+    process = Processing(sketch, {'calls': calls})
+    process.export(str(tmp_path / 'frames'), frames=2, skipframes=1, figsize=(20, 20))
+    assert calls == [(1, 'DrawingContext'), (2, 'DrawingContextProxy'), (3, 'DrawingContext')]
+    assert not hasattr(builtins, 'rect')
+    assert processing.compile_sketch(sketch) is processing.compile_sketch(sketch)
+    for i in range(processing.CODE_CACHE_SIZE + 1):
+        processing.compile_sketch('x = {}'.format(i))
+    assert processing.compile_sketch.cache_info().currsize == processing.CODE_CACHE_SIZE
+
+KEY_SKETCH = '''
+keys = []
+
+def keyPressed():
+    keys.append((frameCount, key))
+
+def draw():
+    background(255)
+    rect(frameCount * 10, 10, 20, 20)
+'''
+
+def test_pipelined_frames_match_serial_frames():
+    from matplotlib.backend_bases import KeyEvent
+    images = []
+    for pipeline in [False, True]:
+        fig = plt.figure()
+        try:
+            process = Processing(KEY_SKETCH, {})
+            anim = process.plot(fig, fig.gca(), realtime=False, pipeline=pipeline)
+            fig.canvas.draw()
+            frames = []
+            for frame in range(6):
+                anim._draw_next_frame(frame, True)
+                if frame == 2:
+                    fig.canvas.callbacks.process('key_press_event',
+                                                 KeyEvent('key_press_event', fig.canvas, 'a'))
+                frames.append(np.asarray(fig.canvas.buffer_rgba()).copy())
+            images.append(frames)
+            keys = process.pipeline.run.ctx['keys'] if pipeline else None
+        finally:
+            if process.pipeline is not None:
+                process.pipeline.stop()
+            plt.close(fig)
+    for a, b in zip(*images):
+        assert np.array_equal(a, b)
+    # The key is pressed while the fifth frame is on screen. The worker may
+    # already have recorded the sixth one, and handles it between two frames.
+    assert keys in ([(5, 'a')], [(6, 'a')])
+
+def test_extension_import_is_lazy():
+    import subprocess
+    import sys
+    code = ('import sys, processingpymat; '
+            'print(any(m.startswith("matplotlib") for m in sys.modules))')
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.decode('utf-8').strip() == 'False'
+
+def test_sketches_render_concurrently_in_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    sketches = [('''
+def setup():
+    size(60, 40)
+
+def draw():
+    background(255)
+    fill(random(255), 0, 0)
+    rect(random(40), random(20), 20, 20)
+''', 'patch'), ('''
+def setup():
+    size(50, 50)
+
+def draw():
+    background(0)
+    stroke(255)
+    line(0, noise(frameCount * 0.1) * height, width, random(height))
+''', 'raster')]
+
+    def render(sketch, renderer):
+        frames = Processing(sketch, {})._render_frames(0, 10, 0, (100, 100), renderer, 100,
+                                                       seed=3)
+        return [rgba.copy() for rgba in frames]
+
+    serial = [render(*s) for s in sketches]
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda s: render(*s), sketches * 2))
+    for frames, expected in zip(results, serial * 2):
+        assert all(np.array_equal(a, b) for a, b in zip(frames, expected))
+    assert serial[0][0].shape == (40, 60, 4) and serial[1][0].shape == (50, 50, 4)
+
+def test_pipeline_failure_is_raised_again():
+    import threading
+    sketch = '''
+def draw():
+    background(255)
+    if frameCount > 4:
+        1 / 0
+'''
+    fig = plt.figure()
+    try:
+        process = Processing(sketch, {})
+        anim = process.plot(fig, fig.gca(), realtime=False, pipeline=True)
+        errors = []
+
+        def step(frame):
+            try:
+                anim._draw_next_frame(frame, True)
+            except ZeroDivisionError as e:
+                errors.append(e)
+
+        for frame in range(8):
+            thread = threading.Thread(target=step, args=(frame,), daemon=True)
+            thread.start()
+            thread.join(5)
+            assert not thread.is_alive()
+    finally:
+        process.pipeline.stop()
+        plt.close(fig)
+    assert len(errors) >= 2
+
+def test_export_does_not_disturb_live_plot(tmp_path):
+    sketch = '''
+def draw():
+    background(255)
+    rect(frameCount * 5, 0, 5, 5)
+'''
+    fig = plt.figure()
+    try:
+        process = Processing(sketch, {})
+        anim = process.plot(fig, fig.gca(), realtime=False)
+        live = process.run
+        fig.canvas.draw()
+        for frame in range(1, 3):
+            anim._draw_next_frame(frame, True)
+        before = [a.get_x() for a in live.gctx.artists if hasattr(a, 'get_x')]
+        process.export(str(tmp_path / 'frames'), frames=2, figsize=(50, 50))
+        for frame in range(3, 5):
+            anim._draw_next_frame(frame, True)
+        after = [a.get_x() for a in live.gctx.artists if hasattr(a, 'get_x')]
+    finally:
+        plt.close(fig)
+    assert after[-1] == before[-1] + 10
+    assert [r['frame'] for r in live.metrics][-4:] == [1, 2, 3, 4]
+    assert [r['frame'] for r in process.metrics] == [0, 1]
@@ -0,0 +1,138 @@
+import numpy as np
+from processingpymat import raster
+
+def test_rect_fill():
+    ctx = raster.RasterContext(None, None, (20, 20))
+    ctx.clear()
+    ctx.background(0)
+    ctx.noStroke()
+    ctx.fill(255, 0, 0)
+    ctx.rect(5, 5, 10, 10)
+    rgba = ctx.to_rgba()
+    assert rgba.shape == (20, 20, 4)
+    assert rgba[10, 10].tolist() == [255, 0, 0, 255]
+    assert rgba[4, 10].tolist() == [0, 0, 0, 255]
+    assert rgba[15, 10].tolist() == [0, 0, 0, 255]
+
+def test_rect_partial_coverage():
+    ctx = raster.RasterContext(None, None, (10, 10))
+    ctx.background(0)
+    ctx.noStroke()
+    ctx.fill(255)
+    ctx.rect(2.5, 2, 5, 5)
+    rgba = ctx.to_rgba()
+    assert rgba[4, 2, 0] in (127, 128)
+    ctx.noSmooth()
+    ctx.background(0)
+    ctx.rect(2.5, 2, 5, 5)
+    assert ctx.to_rgba()[4, 2, 0] in (0, 255)
+
+def test_stroked_rect_band():
+    ctx = raster.RasterContext(None, None, (20, 20))
+    ctx.background(0)
+    ctx.fill(255, 0, 0)
+    ctx.stroke(0, 0, 255)
+    ctx.strokeSize(2)
+    ctx.rect(5, 5, 10, 10)
+    rgba = ctx.to_rgba()
+    assert rgba[10, 10].tolist() == [255, 0, 0, 255]
+    # The band covers [4, 6) on every side, with square corners
+    for y, x in [(10, 4), (10, 5), (4, 10), (15, 10), (4, 4), (15, 15)]:
+        assert rgba[y, x].tolist() == [0, 0, 255, 255]
+    assert rgba[10, 3].tolist() == [0, 0, 0, 255]
+    assert rgba[10, 6].tolist() == [255, 0, 0, 255]
+
+def test_ellipse_under_transform():
+    ctx = raster.RasterContext(None, None, (40, 40))
+    ctx.background(255)
+    ctx.noStroke()
+    ctx.fill(0)
+    ctx.pushMatrix()
+    ctx.translate(30, 10)
+    ctx.rotate(np.pi / 2)
+    ctx.ellipse(0, 0, 16, 4)
+    ctx.popMatrix()
+    rgba = ctx.to_rgba()
+    assert rgba[10, 30, 0] == 0
+    assert rgba[16, 30, 0] == 0
+    assert rgba[10, 36, 0] == 255
+
+def test_polygon_and_line():
+    ctx = raster.RasterContext(None, None, (20, 20))
+    ctx.background(255)
+    ctx.noStroke()
+    ctx.fill(0)
+    ctx.beginShape()
+    ctx.vertex(0, 0)
+    ctx.vertex(20, 0)
+    ctx.vertex(0, 20)
+    ctx.endShape(ctx.CLOSE)
+    rgba = ctx.to_rgba()
+    assert rgba[2, 2, 0] == 0
+    assert rgba[17, 17, 0] == 255
+    ctx.stroke(255, 0, 0)
+    ctx.line(0, 17.5, 20, 17.5)
+    assert ctx.to_rgba()[17, 10].tolist() == [255, 0, 0, 255]
+
+def test_pixels_and_images(tmp_path):
+    import matplotlib.image as mimage
+    from processingpymat import drawing
+    ctx = raster.RasterContext(None, None, (8, 8))
+    ctx.background(0)
+    ctx.loadPixels()
+    assert ctx.pixels[0, 0].tolist() == [0, 0, 0, 255]
+    ctx.pixels[2, 3] = (255, 0, 0, 255)
+    ctx.updatePixels()
+    assert ctx.to_rgba()[2, 3].tolist() == [255, 0, 0, 255]
+
+    path = str(tmp_path / 'image.png')
+    pixels = np.zeros((2, 2, 3))
+    pixels[0, 1] = 1
+    mimage.imsave(path, pixels)
+    ctx.image(drawing.load_image(path), 4, 4, 4, 4)
+    rgba = ctx.to_rgba()
+    assert rgba[4, 6].tolist() == [255, 255, 255, 255]
+    assert rgba[7, 7].tolist() == [0, 0, 0, 255]
+    assert rgba[2, 3].tolist() == [255, 0, 0, 255]
+
+def test_shape_with_contour():
+    ctx = raster.RasterContext(None, None, (20, 20))
+    ctx.background(255)
+    ctx.noStroke()
+    ctx.fill(0)
+    ctx.beginShape()
+    for x, y in [(2, 2), (18, 2), (18, 18), (2, 18)]:
+        ctx.vertex(x, y)
+    ctx.beginContour()
+    for x, y in [(6, 6), (6, 14), (14, 14), (14, 6)]:
+        ctx.vertex(x, y)
+    ctx.endContour()
+    ctx.endShape(ctx.CLOSE)
+    rgba = ctx.to_rgba()
+    assert rgba[4, 4, 0] == 0
+    assert rgba[10, 10, 0] == 255
+    assert rgba[0, 0, 0] == 255
+
+def test_rotated_image(tmp_path):
+    import matplotlib.image as mimage
+    from processingpymat.processing import Processing
+    path = str(tmp_path / 'image.png')
+    pixels = np.zeros((2, 2, 3))
+    pixels[0, 1] = 1
+    mimage.imsave(path, pixels)
+    sketch = '''
+img = loadImage(path)
+
+def draw():
+    background(255, 0, 0)
+    translate(20, 0)
+    rotate(HALF_PI)
+    image(img, 0, 0, 20, 20)
+'''
+    for renderer in ['raster', 'patch']:
+        frame = next(Processing(sketch, {'path': path, 'HALF_PI': np.pi / 2})
+                     ._render_frames(0, 1, 0, (20, 20), renderer, 100))
+        # The top right quarter of the image is rotated to the bottom right
+        assert frame[15, 15, :3].tolist() == [255, 255, 255]
+        assert frame[5, 15, :3].tolist() == [0, 0, 0]
+        assert frame[5, 5, :3].tolist() == [0, 0, 0]
@@ -0,0 +1,106 @@
+import numpy as np
+from processingpymat.processing import Processing
+from processingpymat.raster import RasterContext
+from processingpymat.recording import RecordingContext, load_display_lists, save_display_lists
+
+SKETCH = '''
+def setup():
+    size(60, 40)
+
+def draw():
+    stroke(0)
+    fill(255, 0, 0)
+    background(255)
+    rect(5, 5, 10, 10)
+    if frameCount > 2:
+        noStroke()
+        ellipses([30, 40], [20, 20], 6, 6, fills=[0, 128])
+    text('x', 50, 30)
+'''
+
+def test_recording_replays_like_direct_drawing():
+    direct = list(Processing(SKETCH, {})._render_frames(0, 4, 0, (60, 40), 'raster', 100))
+    process = Processing(SKETCH, {}, recording=True)
+    recorded = list(process._render_frames(0, 4, 0, (60, 40), 'raster', 100))
+    for a, b in zip(direct, recorded):
+        assert np.array_equal(a, b)
+    assert process.recorder.display_list == process.run.last_list
+
+def test_display_list_diff():
+    lists = Processing(SKETCH, {}).record(frames=4)
+    assert len(lists) == 5
+    assert lists[2] == lists[1] and lists[2] is not lists[1]
+    assert lists[2].diff(lists[1]) == []
+    # The ellipses are inserted before the text
+    assert lists[3].diff(lists[2]) == [(2, 4)]
+    assert lists[2].diff(lists[3]) == [(2, 3)]
+
+def test_display_lists_round_trip(tmp_path):
+    ctx = RecordingContext()
+    ctx.background(0)
+    ctx.stroke(0, 255, 0)
+    ctx.lines([0, 0], [0, 5], [20, 20], [0, 5], strokes=[[255, 0, 0], [0, 0, 255]])
+    ctx.noFill()
+    ctx.rect(2, 2, 10, 10)
+    path = str(tmp_path / 'frames.npz')
+    save_display_lists(path, [ctx.display_list])
+    loaded = load_display_lists(path)
+    assert loaded == [ctx.display_list]
+
+    images = []
+    for display_list in [ctx.display_list, loaded[0]]:
+        raster = RasterContext(None, None, (20, 20))
+        display_list.replay(raster)
+        images.append(raster.to_rgba())
+    assert np.array_equal(images[0], images[1])
+    assert images[0][10, 10].tolist() == [0, 0, 0, 255]
+    assert images[0][10, 2, 1] > 0
+
+def test_recorded_pixels_are_snapshots():
+    sketch = '''
+def draw():
+    background(0)
+    loadPixels()
+    pixels[5, :frameCount] = (255, 255, 255, 255)
+    updatePixels()
+'''
+    direct = list(Processing(sketch, {})._render_frames(0, 3, 0, (20, 10), 'raster', 100))
+    process = Processing(sketch, {}, recording=True)
+    recorded = list(process._render_frames(0, 3, 0, (20, 10), 'raster', 100))
+    for a, b in zip(direct, recorded):
+        assert np.array_equal(a, b)
+    lists = Processing(sketch, {}).record(frames=2)
+    assert lists[2].diff(lists[1]) == [(1, 2)]
+    assert lists[1].arrays[0][5, :3, 0].tolist() == [255, 0, 0]
+
+def test_diff_is_aligned_on_commands():
+    a, b = RecordingContext(), RecordingContext()
+    for ctx in [a, b]:
+        ctx.background(0)
+        if ctx is b:
+            ctx.ellipse(5, 5, 2, 2)
+        for i in range(3):
+            ctx.rect(i, i, 2, 2)
+    assert b.display_list.diff(a.display_list) == [(1, 2)]
+    assert a.display_list.diff(b.display_list) == [(1, 1)]
+    assert b.display_list.common_prefix(a.display_list) == 1
+
+def test_raster_replay_resumes_after_unchanged_commands():
+    sketch = '''
+def draw():
+    background(255)
+    for i in range(10):
+        fill(i * 20)
+        ellipse(i * 6, 10, 5, 5)
+    translate(0, 5)
+    fill(255, 0, 0)
+    rect(frameCount * 3, 20, 8, 8)
+'''
+    direct = list(Processing(sketch, {})._render_frames(0, 5, 0, (60, 40), 'raster', 100))
+    process = Processing(sketch, {}, recording=True)
+    recorded = list(process._render_frames(0, 5, 0, (60, 40), 'raster', 100))
+    for a, b in zip(direct, recorded):
+        assert np.array_equal(a, b)
+    # The frame was replayed from the rect, the first command which changed
+    last = process.run.last_list
+    assert last._checkpoint[1] == len(last) - 1